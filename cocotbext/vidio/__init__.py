@@ -1,2 +1,15 @@
 from .version import __version__
-from .vidio import GenAXIStream, ConvertAXIStreamCS
\ No newline at end of file
+from .vidio import GenAXIStream, GenAXIStreamLines, GenAXIStreamBatch, ConvertAXIStreamCS, ConvertAXIStreamCSBatch
+from .source import VideoSource, drive_beats
+from .sink import VideoSink
+from .scoreboard import Scoreboard, compare_frames
+from .signature import FrameSignature, frame_signature, check_signature
+from .rawvideo import RawVideoReader, RawVideoWriter
+from .frame import VideoFrame
+from .resample import resample_chroma
+from .csc import csc_fixed
+from .sequence import GenAXIStreamSequence, DirtyLinePacker
+from .utils import BeatArray, mat2beats
+from .cache import StimulusCache, MemoryCache
+from .st2110 import ST2110Packetizer, ST2110Depacketizer
+from .instrument import Instrumentation, StageEvent, add_hook, remove_hook
\ No newline at end of file
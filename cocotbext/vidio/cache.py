@@ -0,0 +1,179 @@
+""" On-disk and in-memory stimulus caches"""
+
+import collections
+import hashlib
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from .utils import BeatArray
+from .version import __version__
+
+class StimulusCache:
+    """
+    Content-addressed cache of packed frames and their reference matrices,
+    one directory of .npy files per entry, opened memory-mapped on a hit
+    - path: cache directory, created if missing
+    - maxBytes: size limit, least recently used entries are evicted once
+      the cache grows past it
+
+    Keys hash the generating parameters and the package version, so a new
+    release never reads frames packed by an older one.
+
+        cache = StimulusCache(os.path.expanduser("~/.cache/vidio"))
+        axis, ref = GenAXIStream(3840, 2160, 4, 10, Pattern.h_incr, ColorFormat.YUV422, cache=cache)
+    """
+    def __init__(self, path, maxBytes=4 << 30):
+        self.path = path
+        self.maxBytes = maxBytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def key(*params, data=()):
+        """
+        - returns: hex digest of params, the package version and the
+          bytes-like objects in data
+        """
+        h = hashlib.sha256(repr((__version__,) + tuple(params)).encode())
+        for chunk in data:
+            h.update(chunk)
+        return h.hexdigest()
+
+    def _entry(self, key):
+        return os.path.join(self.path, key)
+
+    def fetch(self, key):
+        """
+        - returns: (BeatArray, reference) of key, arrays memory-mapped copy
+          on write, or None on a miss
+        """
+        entry = self._entry(key)
+        try:
+            arrays = [np.load(os.path.join(entry, name + ".npy"), mmap_mode='c')
+                for name in ("tdata", "tuser", "tlast", "reference")]
+            resH = int(np.load(os.path.join(entry, "resH.npy")))
+            os.utime(entry)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        tdata, tuser, tlast, reference = arrays
+        lines = int(np.unpackbits(tlast, count=tdata.shape[0], bitorder='little').sum())
+        return BeatArray(tdata, np.asarray(tuser), np.asarray(tlast), lines, resH or None), reference
+
+    def store(self, key, beats, reference):
+        """ adds an entry, then evicts least recently used entries over maxBytes"""
+        tmp = tempfile.mkdtemp(dir=self.path, prefix=".tmp-")
+        try:
+            for name, array in (("tdata", beats.tdata), ("tuser", beats.tuser),
+                    ("tlast", beats.tlast), ("reference", reference)):
+                np.save(os.path.join(tmp, name + ".npy"), np.ascontiguousarray(array))
+            np.save(os.path.join(tmp, "resH.npy"), np.array(beats.resH or 0))
+            os.rename(tmp, self._entry(key))
+        except OSError:
+            # another process stored the same entry first
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.evict()
+
+    def evict(self):
+        """ removes least recently used entries until the cache fits in maxBytes"""
+        entries = []
+        total = 0
+        for name in os.listdir(self.path):
+            entry = self._entry(name)
+            if name.startswith(".") or not os.path.isdir(entry):
+                continue
+            size = sum(f.stat().st_size for f in os.scandir(entry))
+            entries.append((os.stat(entry).st_mtime, size, entry))
+            total += size
+        for _, size, entry in sorted(entries):
+            if total <= self.maxBytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        """ removes every entry"""
+        for name in os.listdir(self.path):
+            shutil.rmtree(self._entry(name), ignore_errors=True)
+
+    def size(self):
+        """
+        - returns: bytes used by all entries
+        """
+        return sum(f.stat().st_size for name in os.listdir(self.path)
+            if os.path.isdir(self._entry(name)) for f in os.scandir(self._entry(name)))
+
+
+class MemoryCache:
+    """
+    In-memory cache of packed frames and their reference matrices, bounded
+    by bytes, for the same cache=... arguments as StimulusCache
+    - maxBytes: size limit, least recently used entries are evicted once
+      the cache grows past it
+
+    References are kept as uint16 when their values fit and every fetch
+    returns a writable copy in the dtype they were stored with. The packed
+    BeatArray is shared between fetches and read-only.
+
+        cache = MemoryCache(256 << 20)
+        axis, ref = GenAXIStream(1920, 1080, 2, 10, Pattern.color_bars, ColorFormat.YUV422, cache=cache)
+    """
+    key = staticmethod(StimulusCache.key)
+
+    def __init__(self, maxBytes=256 << 20):
+        self.maxBytes = maxBytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._bytes = 0
+
+    def fetch(self, key):
+        """
+        - returns: (BeatArray, reference) of key, or None on a miss
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        beats, reference, dtype = entry
+        return beats, reference.astype(dtype)
+
+    def store(self, key, beats, reference):
+        """ adds an entry, then evicts least recently used entries over maxBytes"""
+        reference = np.asarray(reference)
+        compact = reference.astype(np.uint16) if reference.size and 0 <= reference.min() and reference.max() <= 0xffff \
+            else reference.copy()
+        beats = BeatArray(beats.tdata.copy(), beats.tuser.copy(), beats.tlast.copy(), beats.lines, beats.resH)
+        for array in (beats.tdata, beats.tuser, beats.tlast, compact):
+            array.flags.writeable = False
+        if key in self._entries:
+            self._bytes -= _entry_bytes(*self._entries.pop(key))
+        self._entries[key] = (beats, compact, reference.dtype)
+        self._bytes += _entry_bytes(beats, compact)
+        self.evict()
+
+    def evict(self):
+        """ removes least recently used entries until the cache fits in maxBytes"""
+        while self._entries and self._bytes > self.maxBytes:
+            self._bytes -= _entry_bytes(*self._entries.popitem(last=False)[1])
+
+    def clear(self):
+        """ removes every entry"""
+        self._entries.clear()
+        self._bytes = 0
+
+    def size(self):
+        """
+        - returns: bytes used by all entries
+        """
+        return self._bytes
+
+def _entry_bytes(beats, reference, *_):
+    return beats.tdata.nbytes + beats.tuser.nbytes + beats.tlast.nbytes + reference.nbytes
@@ -15,3 +15,21 @@ class Pattern(enum.IntEnum):
     p_incr = 0
     rand = 1
     h_incr = 2
+    seeded = 3  # counter-based random, any line computed from (seed, frame, line)
+    color_bars = 4  # 75% bars, white yellow cyan green magenta red blue black
+    ramp = 5  # full range horizontal grey ramp
+    zone_plate = 6  # circular zone plate, reaching Nyquist at the edges
+    checkerboard = 7
+    solid_black = 8
+    solid_white = 9
+    solid_red = 10
+    solid_green = 11
+    solid_blue = 12
+    moving_box = 13  # white box on black, moves with frameIndex
+
+class RawFormat(enum.IntEnum):
+    I420 = 0    # 8-bit planar Y, U, V 4:2:0
+    NV12 = 1    # 8-bit planar Y, interleaved UV 4:2:0
+    P010 = 2    # 10-bit in the MSBs of 16-bit words, planar Y, interleaved UV 4:2:0
+    GBRP10 = 3  # 10-bit in the LSBs of 16-bit words, planar G, B, R
+    V210 = 4    # 10-bit packed 4:2:2, 6 pixels in 4 32-bit words, lines padded to 128 bytes
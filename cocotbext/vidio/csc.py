@@ -1,57 +1,268 @@
 """ Color Space Conversion"""
 
+import functools
 import numpy as np
-from .colorconv import r2y_601, r2y_709, r2y_2020
-from .constants import Standard
+from .colorconv import r2y_601, r2y_709, r2y_2020, calibrate
+from .constants import Standard, ColorFormat
+from .frame import VideoFrame
+from .resample import resample_chroma
+from .instrument import instrumented, produced
 
-def rgb2yuv(rgb, standard):
-    """
-    returns matrix with shape (m*n, 3)
-    """
+def _r2y(standard):
     if standard == Standard.BT601:
-        r2y = r2y_601()
+        return r2y_601()
     elif standard == Standard.BT709:
-        r2y = r2y_709()
+        return r2y_709()
     elif standard == Standard.BT2020:
-        r2y = r2y_2020()
-    else:
-        raise ValueError("Unknown standard '%s'; valid are '601' and '709'." % standard)
+        return r2y_2020()
+    raise ValueError("Unknown standard '%s'; valid are '601' and '709'." % standard)
+
+@instrumented("csc", produced)
+def rgb2yuv(rgb, standard=None):
+    """
+    returns matrix with shape (m*n, 3)
+    rgb can also be an RGB VideoFrame, then a YUV444 VideoFrame is returned
+    and standard defaults to the frame's standard
+    """
+    if isinstance(rgb, VideoFrame):
+        frame = rgb
+        standard = frame.standard if standard is None else standard
+        # planes are in bus order G, B, R
+        g, b, r = (plane.reshape(-1) for plane in frame.planes)
+        yuv = rgb2yuv(np.stack((r, g, b), axis=1), standard)
+        planes = [plane.reshape(frame.resV, frame.resH) for plane in yuv]
+        return VideoFrame(planes, frame.resH, frame.resV, ColorFormat.YUV444, frame.pixelQuant, standard)
+    r2y = _r2y(standard)
     rgb = rgb / 1023
     rgb = np.array(rgb).T
     yuv = np.array(np.dot(r2y, rgb))
     return np.clip(yuv * 1023, 0, 1023).astype(np.uint16)
 
-def yuv2rgb():
-    pass
+_COLORCONV_STANDARD = {Standard.BT601: "601", Standard.BT709: "709", Standard.BT2020: "2020"}
+
+def _levels_affine(standard, pixelQuant, fullRange):
+    """
+    (matrix, offset) in float converting full range RGB code values, ordered
+    R, G, B, to YUV code values, yuv = matrix @ rgb + offset; TV range levels
+    are the 8-bit ones of colorconv.calibrate scaled by 2**(pixelQuant-8).
+    This is the inverse of colorconv.compute_conversion_matrix at 8 bits and
+    at 10 bits for BT.709/BT.2020, the levels it knows exactly.
+    """
+    if standard not in _COLORCONV_STANDARD:
+        raise ValueError("Unknown standard '%s'; valid are '601', '709' and '2020'." % standard)
+    q = pixelQuant
+    maxval = (1 << q) - 1
+    if fullRange:
+        black, white, cmin, cmax, achromatic = 0, maxval, 0, maxval, 1 << (q-1)
+    else:
+        # 8-bit code levels, scaled to the bit depth as BT.709/BT.2020 do
+        levels = np.round(np.array(calibrate(_COLORCONV_STANDARD[Standard(standard)], "8bit")) * 255)
+        black, white, cmin, cmax, achromatic = levels * 2.0**(q-8)
+    matrix = np.diag([white - black, cmax - cmin, cmax - cmin]) @ _r2y(standard) / maxval
+    offset = np.array([black, achromatic, achromatic])
+    return matrix, offset
 
+@functools.lru_cache(maxsize=None)
+def _tv_affine(standard, pixelQuant, toRGB):
+    """
+    (matrix, shift) converting TV range YUV code values to full range RGB
+    code values, or the inverse with toRGB False; RGB is ordered R, G, B.
+    Same levels as csc_coefficients.
+    """
+    matrix, shift = _levels_affine(standard, pixelQuant, False)
+    if toRGB:
+        matrix = np.linalg.inv(matrix)
+        shift = -matrix @ shift
+    return matrix, shift
+
+def _affine(planes, matrix, shift, maxval):
+    """ matrix @ planes + shift, rounded and clipped, as three uint16 arrays"""
+    out = []
+    for i in range(3):
+        acc = planes[0] * matrix[i, 0]
+        acc += planes[1] * matrix[i, 1]
+        acc += planes[2] * matrix[i, 2]
+        acc += shift[i] + 0.5
+        np.clip(acc, 0, maxval, out=acc)
+        out.append(acc.astype(np.uint16))
+    return out
+
+@instrumented("csc", produced)
+def yuv2rgb(yuv, standard=None, pixelQuant=10):
+    """
+    converts TV range YUV444 to full range RGB, with the TV range levels of
+    csc_coefficients
+    - yuv: numpy array of shape (m*n, 3), or a YUV444 VideoFrame, then an RGB
+      VideoFrame is returned and standard and pixelQuant come from the frame
+    - returns matrix with shape (3, m*n), RGB ordered R, G, B
+    """
+    if isinstance(yuv, VideoFrame):
+        frame = yuv
+        if frame.format != ColorFormat.YUV444:
+            raise ValueError("Unsupported ColorFormat, yuv2rgb needs YUV444")
+        standard = frame.standard if standard is None else standard
+        matrix, shift = _tv_affine(standard, frame.pixelQuant, True)
+        r, g, b = _affine(frame.planes, matrix, shift, (1 << frame.pixelQuant) - 1)
+        # planes are in bus order G, B, R
+        return VideoFrame([g, b, r], frame.resH, frame.resV, ColorFormat.RGB, frame.pixelQuant, standard)
+    yuv = np.reshape(np.asarray(yuv), (-1, 3))
+    matrix, shift = _tv_affine(standard, pixelQuant, True)
+    return np.array(_affine([yuv[:, 0], yuv[:, 1], yuv[:, 2]], matrix, shift, (1 << pixelQuant) - 1))
+
+def _rgb2yuv_tv(frame, standard):
+    """ full range RGB VideoFrame to TV range YUV444, inverse of yuv2rgb"""
+    matrix, shift = _tv_affine(standard, frame.pixelQuant, False)
+    g, b, r = frame.planes
+    planes = _affine([r, g, b], matrix, shift, (1 << frame.pixelQuant) - 1)
+    return VideoFrame(planes, frame.resH, frame.resV, ColorFormat.YUV444, frame.pixelQuant, standard)
+
+def _resample(frame, outFormat):
+    """ chroma resampling, keeping the pairwise averages of y444to422 and y420to422"""
+    if frame.format == outFormat:
+        return VideoFrame([plane.copy() for plane in frame.planes], frame.resH, frame.resV,
+            frame.format, frame.pixelQuant, frame.standard)
+    if frame.format == ColorFormat.YUV444 and outFormat == ColorFormat.YUV422:
+        return y444to422(frame)
+    if frame.format == ColorFormat.YUV420 and outFormat == ColorFormat.YUV422:
+        return y420to422(frame)
+    return resample_chroma(frame, outFormat)
+
+@instrumented("csc", produced)
+def convert_frame(frame, outFormat, standard=None):
+    """
+    converts a VideoFrame between any two of RGB, YUV444, YUV422 and YUV420
+    - frame: VideoFrame
+    - outFormat: RGB, YUV444, YUV422, YUV420
+    - standard: BT601, BT709, BT2020, default the frame's standard
+    - returns: new VideoFrame
+
+    YUV is TV range and RGB full range, as in colorconv. Subsampled chroma
+    is interpolated to 4:4:4 before converting to RGB and decimated after
+    converting from RGB.
+    """
+    standard = frame.standard if standard is None else standard
+    if frame.format == ColorFormat.RGB:
+        if outFormat == ColorFormat.RGB:
+            return _resample(frame, outFormat)
+        return _resample(_rgb2yuv_tv(frame, standard), outFormat)
+    if outFormat == ColorFormat.RGB:
+        return yuv2rgb(_resample(frame, ColorFormat.YUV444), standard)
+    return _resample(frame, outFormat)
+
+@instrumented("resample", produced)
 def y444to422(y444):
     """
     returns matrix with shape (m*n, 3)
+    y444 can also be a YUV444 VideoFrame, then a YUV422 VideoFrame is returned
     """
-    y422 = np.zeros((y444.shape[0], y444.shape[1]), dtype=np.uint16)
-    y422 = y444
-    for i in range(y444.shape[0]):
-        if not(i%2):
-            y422[i][0] = y444[i][0]
-            y422[i][1] = (y444[i][1] // 2) + (y444[i+1][1] // 2)
-            y422[i][2] = (y444[i][2] // 2) + (y444[i+1][2] // 2)
+    if isinstance(y444, VideoFrame):
+        frame = y444
+        planes = [frame.planes[0].copy()]
+        for plane in frame.planes[1:]:
+            right = plane[:, 1::2] if plane.shape[1] % 2 == 0 else np.concatenate([plane[:, 1::2], plane[:, -1:]], axis=1)
+            planes.append((plane[:, 0::2] // 2) + (right // 2))
+        return VideoFrame(planes, frame.resH, frame.resV, ColorFormat.YUV422, frame.pixelQuant, frame.standard)
+    y422 = np.array(y444, copy=True)
+    y422[0::2, 1:] = (y444[0::2, 1:] // 2) + (y444[1::2, 1:] // 2)
     return y422.T
 
-def y420to422(y420, resH):
+@instrumented("resample", produced)
+def y420to422(y420, resH=None):
     """
     returns matrix with shape (m*n, 3)
+    y420 can also be a YUV420 VideoFrame, then a YUV422 VideoFrame is returned
     """
-    y422 = np.zeros((y420.shape[0], y420.shape[1]), dtype=np.uint16)
-    y422 = y420
-    resV = int(len(y422) / resH)
-    for i in range(resV):
-        if i%2:
-            for j in range(resH):
-                y422[i*resH + j][0] = y420[i*resH + j][0]
-                if i == resV-1 :
-                    y422[i*resH + j][1] = (y420[(i-1)*resH + j][1])
-                    y422[i*resH + j][2] = (y420[(i-1)*resH + j][2])
-                else :
-                    y422[i*resH + j][1] = (y420[(i-1)*resH + j][1] + y420[(i+1)*resH + j][1]) / 2
-                    y422[i*resH + j][2] = (y420[(i-1)*resH + j][2] + y420[(i+1)*resH + j][2]) / 2
-    return y422.T
+    if isinstance(y420, VideoFrame):
+        # odd lines average the chroma of the lines above and below, the
+        # last odd line repeats the line above
+        return resample_chroma(y420, ColorFormat.YUV422, vTaps=(1, 1), rounding=False)
+    mat = np.reshape(np.asarray(y420), (-1, resH, 3))
+    y422 = mat.copy()
+    resV = mat.shape[0]
+    odd = np.arange(1, resV, 2)
+    inner = odd[odd < resV-1]
+    y422[inner, :, 1:] = (mat[inner-1, :, 1:] + mat[inner+1, :, 1:]) / 2
+    if resV % 2 == 0:
+        y422[resV-1, :, 1:] = mat[resV-2, :, 1:]
+    return np.reshape(y422, (-1, 3)).T
+
+@functools.lru_cache(maxsize=None)
+def csc_coefficients(standard, pixelQuant=10, fullRange=False, toRGB=False, fracBits=12):
+    """
+    returns (matrix, offset) of the fixed-point conversion, int64 arrays
+    scaled by 2**fracBits, so that out = (matrix @ in + offset) >> fracBits
+    - standard: BT601, BT709, BT2020
+    - pixelQuant: Quantization of both RGB and YUV, 10
+    - fullRange: full range YUV, otherwise TV range levels from colorconv.calibrate
+    - toRGB: YUV to RGB instead of RGB to YUV
+    RGB is ordered R, G, B. Results are cached and read-only.
+    """
+    # yuv = offset + matrix @ rgb, in code values
+    matrix, offset = _levels_affine(standard, pixelQuant, fullRange)
+    if toRGB:
+        matrix = np.linalg.inv(matrix)
+        offset = -matrix @ offset
+    matrix = np.round(matrix * (1 << fracBits)).astype(np.int64)
+    offset = np.round(offset * (1 << fracBits)).astype(np.int64)
+    matrix.setflags(write=False)
+    offset.setflags(write=False)
+    return matrix, offset
+
+def _csc_planes(planes, matrix, offset, fracBits, rounding, maxval):
+    """ applies the fixed-point conversion to three planes, returns three new arrays"""
+    if rounding == "round":
+        offset = offset + (1 << fracBits >> 1)
+    elif rounding != "truncate":
+        raise ValueError("Unknown rounding '%s'; valid are 'round' and 'truncate'." % rounding)
+    acc_type = np.int32 if fracBits + maxval.bit_length() + 3 < 31 else np.int64
+    out = []
+    for i in range(3):
+        acc = np.multiply(planes[0], int(matrix[i, 0]), dtype=acc_type)
+        for k in (1, 2):
+            if matrix[i, k]:
+                acc += np.multiply(planes[k], int(matrix[i, k]), dtype=acc_type)
+        acc += int(offset[i])
+        acc >>= fracBits
+        np.clip(acc, 0, maxval, out=acc)
+        out.append(acc)
+    return out
+
+@instrumented("csc", produced)
+def csc_fixed(mat, standard=None, pixelQuant=10, toRGB=False, fullRange=False, fracBits=12, rounding="round"):
+    """
+    bit-accurate fixed-point color space conversion, RGB to YUV444 or with
+    toRGB YUV444 to RGB, using the cached csc_coefficients
+    - mat: numpy array of shape (m*n, 3), RGB ordered R, G, B; an int32 array
+      is converted in place. Can also be an RGB or YUV444 VideoFrame, then a
+      new VideoFrame of the other format is returned and standard,
+      pixelQuant and the direction come from the frame
+    - rounding: "round" (half up) or "truncate"
+    - returns: converted matrix, int32, clipped to [0, 2**pixelQuant - 1]
+    """
+    if isinstance(mat, VideoFrame):
+        frame = mat
+        standard = frame.standard if standard is None else standard
+        toRGB = frame.format != ColorFormat.RGB
+        if frame.format not in (ColorFormat.RGB, ColorFormat.YUV444):
+            raise ValueError("Unsupported ColorFormat, csc needs RGB or YUV444")
+        maxval = (1 << frame.pixelQuant) - 1
+        matrix, offset = csc_coefficients(standard, frame.pixelQuant, fullRange, toRGB, fracBits)
+        # RGB planes are in bus order G, B, R
+        planes = frame.planes if toRGB else [frame.planes[2], frame.planes[0], frame.planes[1]]
+        out = _csc_planes(planes, matrix, offset, fracBits, rounding, maxval)
+        if toRGB:
+            out = [out[1], out[2], out[0]]
+        return VideoFrame([plane.astype(np.uint16) for plane in out], frame.resH, frame.resV,
+            ColorFormat.RGB if toRGB else ColorFormat.YUV444, frame.pixelQuant, standard)
+
+    if isinstance(mat, np.ndarray) and mat.dtype == np.int32:
+        x = mat
+    else:
+        x = np.array(mat, dtype=np.int32)
+    pixels = np.reshape(x, (-1, 3))
+    maxval = (1 << pixelQuant) - 1
+    matrix, offset = csc_coefficients(standard, pixelQuant, fullRange, toRGB, fracBits)
+    out = _csc_planes([pixels[:, 0], pixels[:, 1], pixels[:, 2]], matrix, offset, fracBits, rounding, maxval)
+    for i in range(3):
+        pixels[:, i] = out[i]
+    return x
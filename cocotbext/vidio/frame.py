@@ -0,0 +1,114 @@
+""" Planar video frame"""
+
+import numpy as np
+
+from .constants import ColorFormat, Standard
+
+def chroma_shape(resH, resV, format):
+    """
+    - returns: (rows, columns) of a chroma plane
+    """
+    if format == ColorFormat.YUV422:
+        return (resV, (resH + 1) // 2)
+    elif format == ColorFormat.YUV420:
+        return ((resV + 1) // 2, (resH + 1) // 2)
+    return (resV, resH)
+
+def _chroma_steps(format):
+    """ (horizontal, vertical) chroma subsampling steps"""
+    if format == ColorFormat.YUV422:
+        return 2, 1
+    elif format == ColorFormat.YUV420:
+        return 2, 2
+    return 1, 1
+
+class VideoFrame:
+    """
+    Planar frame with uint16 samples, chroma planes stored at their
+    subsampled size
+    - planes: three numpy arrays, in the channel order of mat2axis (Y, U, V
+      for YUV formats)
+    - resH: Horizontal resoltuion, >1
+    - resV: Vertixal resolution, >1
+    - format: RGB, YUV444, YUV422, YUV420
+    - pixelQuant: Quantization, 10
+    - standard: BT601, BT709, BT2020
+    """
+    __slots__ = ("planes", "resH", "resV", "format", "pixelQuant", "standard")
+
+    def __init__(self, planes, resH, resV, format, pixelQuant=10, standard=Standard.BT2020):
+        self.planes = tuple(planes)
+        self.resH = resH
+        self.resV = resV
+        self.format = format
+        self.pixelQuant = pixelQuant
+        self.standard = standard
+
+    @classmethod
+    def zeros(cls, resH, resV, format, pixelQuant=10, standard=Standard.BT2020):
+        chroma = chroma_shape(resH, resV, format)
+        planes = (np.zeros((resV, resH), dtype=np.uint16),
+            np.zeros(chroma, dtype=np.uint16), np.zeros(chroma, dtype=np.uint16))
+        return cls(planes, resH, resV, format, pixelQuant, standard)
+
+    @classmethod
+    def from_matrix(cls, matrix, resH, format, pixelQuant=10, standard=Standard.BT2020):
+        """
+        - matrix: numpy array of shape (r*c, 3), chroma of subsampled formats
+          taken from the even pixels (and even lines for YUV420)
+        """
+        mat = np.reshape(np.asarray(matrix), (-1, resH, 3))
+        step_h, step_v = _chroma_steps(format)
+        planes = (mat[:, :, 0].astype(np.uint16),
+            mat[::step_v, ::step_h, 1].astype(np.uint16),
+            mat[::step_v, ::step_h, 2].astype(np.uint16))
+        return cls(planes, resH, mat.shape[0], format, pixelQuant, standard)
+
+    def to_matrix(self):
+        """
+        - returns: numpy array of shape (r*c, 3), dtype uint16, dropped chroma set to 0
+        """
+        mat = np.zeros((self.resV, self.resH, 3), dtype=np.uint16)
+        step_h, step_v = _chroma_steps(self.format)
+        mat[:, :, 0] = self.planes[0]
+        mat[::step_v, ::step_h, 1] = self.planes[1]
+        mat[::step_v, ::step_h, 2] = self.planes[2]
+        return np.reshape(mat, (self.resV*self.resH, 3))
+
+    @property
+    def nbytes(self):
+        return sum(plane.nbytes for plane in self.planes)
+
+    def __eq__(self, other):
+        if not isinstance(other, VideoFrame):
+            return NotImplemented
+        return (self.format == other.format and self.resH == other.resH and self.resV == other.resV
+            and all(np.array_equal(a, b) for a, b in zip(self.planes, other.planes)))
+
+    def __repr__(self):
+        return "VideoFrame(%dx%d, %s, %d bit, %s)" % (self.resH, self.resV,
+            ColorFormat(self.format).name, self.pixelQuant, Standard(self.standard).name)
+
+    def component(self, n, ch, lines, p, beats):
+        """
+        - returns: samples of pixel n of every beat of ch, shape (len(lines), beats)
+        - lines: slice of frame lines
+        """
+        if ch == 0 or self.format in (ColorFormat.RGB, ColorFormat.YUV444):
+            plane = self.planes[ch][lines]
+            return plane[:, :beats*p].reshape(-1, beats, p)[:, :, n]
+        rows = np.arange(self.resV)[lines]
+        if self.format == ColorFormat.YUV420:
+            rows = rows // 2
+        plane = self.planes[ch][rows]
+        return plane[:, :beats*p//2].reshape(-1, beats, p//2)[:, :, n//2]
+
+    def set_component(self, n, ch, lines, p, beats, values):
+        """ inverse of component, values of shape (len(lines), beats)"""
+        if ch == 0 or self.format in (ColorFormat.RGB, ColorFormat.YUV444):
+            self.planes[ch][lines, n:beats*p:p] = values
+            return
+        rows = np.arange(self.resV)[lines]
+        if self.format == ColorFormat.YUV420:
+            rows = rows // 2
+        self.planes[ch][rows, n//2:beats*p//2:p//2] = values
@@ -0,0 +1,232 @@
+""" Per-stage instrumentation"""
+
+import functools
+import json
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+
+from .frame import VideoFrame
+
+# callbacks receiving a StageEvent per instrumented call, none when off
+_hooks = []
+_local = threading.local()
+
+class StageEvent:
+    """
+    One call of an instrumented stage
+    - stage: pattern, csc, resample, pack, unpack, generate, convert
+    - function: name of the instrumented function
+    - seconds: wall time, excluding nested instrumented stages
+    - pixels: pixels processed
+    - bytes: bytes produced when packing or generating, consumed when unpacking
+    - allocated: peak traced memory above the start of the call, nested
+      stages included, None unless tracemalloc is tracing
+    """
+    __slots__ = ("stage", "function", "seconds", "pixels", "bytes", "allocated")
+
+    def __init__(self, stage, function, seconds, pixels, bytes, allocated):
+        self.stage = stage
+        self.function = function
+        self.seconds = seconds
+        self.pixels = pixels
+        self.bytes = bytes
+        self.allocated = allocated
+
+def add_hook(callback):
+    """ calls callback(StageEvent) after every instrumented call"""
+    _hooks.append(callback)
+
+def remove_hook(callback):
+    _hooks.remove(callback)
+
+def instrumented(stage, size=None):
+    """
+    decorator reporting calls of a function as stage
+    - size: size(result, *args, **kwargs) returning (pixels, bytes)
+
+    When no hook is installed the wrapper only tests the hook list.
+    """
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _hooks:
+                return function(*args, **kwargs)
+            return _call(stage, size, function, args, kwargs)
+        return wrapper
+    return decorate
+
+def _pixels(data):
+    """ pixels of a matrix, stack of matrices or VideoFrame, 0 for anything else"""
+    if isinstance(data, VideoFrame):
+        return data.resH*data.resV
+    if isinstance(data, np.ndarray):
+        return data.size // 3
+    return 0
+
+def _nbytes(data):
+    """ bytes of arrays, VideoFrames, BeatArrays, buffers and lists of AXIS lines"""
+    if isinstance(data, VideoFrame):
+        return sum(plane.nbytes for plane in data.planes)
+    if isinstance(data, np.ndarray):
+        return data.nbytes
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return len(data)
+    if isinstance(data, (list, tuple)):
+        return sum(_nbytes(item) for item in data)
+    if hasattr(data, "tdata"):
+        return _nbytes(data.tdata)
+    return 0
+
+def produced(result, *args, **kwargs):
+    """ size of a stage returning a frame, or (frame, reference)"""
+    if isinstance(result, tuple):
+        return _pixels(result[1]), _nbytes(result[0])
+    return _pixels(result), _nbytes(result)
+
+def generated(result, resH, resV, *args, **kwargs):
+    """ size of a stage generating one resH x resV frame, as (frame, reference)"""
+    return resH*resV, _nbytes(result[0])
+
+def packed(result, matrix, *args, **kwargs):
+    """ size of a stage packing matrix"""
+    return _pixels(matrix), _nbytes(result)
+
+def repacked(result, beats, *args, **kwargs):
+    """ size of a stage rebuilding AXIS lines from beats, a BeatArray"""
+    return (beats.resH or 0)*beats.lines, _nbytes(result)
+
+def unpacked(result, axisFrame, *args, **kwargs):
+    """ size of a stage unpacking axisFrame"""
+    return _pixels(result), _nbytes(axisFrame)
+
+def _call(stage, size, function, args, kwargs):
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    tracing = tracemalloc.is_tracing()
+    start_mem = 0
+    if tracing:
+        if stack:
+            stack[-1][1] = max(stack[-1][1], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        start_mem = tracemalloc.get_traced_memory()[0]
+    # [time in nested stages, peak traced memory of nested stages, stage]
+    frame = [0.0, 0, stage]
+    stack.append(frame)
+    start = time.perf_counter()
+    try:
+        result = function(*args, **kwargs)
+    finally:
+        elapsed = time.perf_counter() - start
+        stack.pop()
+    allocated = None
+    if tracing:
+        peak = max(tracemalloc.get_traced_memory()[1], frame[1])
+        allocated = peak - start_mem
+    if stack:
+        stack[-1][0] += elapsed
+        if tracing:
+            stack[-1][1] = max(stack[-1][1], peak)
+    # a call nested in the same stage, e.g. a recursion, is counted by the outer call
+    pixels, nbytes = size(result, *args, **kwargs) if size and not (stack and stack[-1][2] == stage) else (0, 0)
+    event = StageEvent(stage, function.__name__, elapsed - frame[0], int(pixels), int(nbytes), allocated)
+    for hook in list(_hooks):
+        hook(event)
+    return result
+
+class StageStats:
+    """
+    Totals of one stage
+    - calls, seconds, pixels, bytes: sums over the calls
+    - allocated: largest allocated of the calls, None without memory tracing
+    """
+    __slots__ = ("calls", "seconds", "pixels", "bytes", "allocated")
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.pixels = 0
+        self.bytes = 0
+        self.allocated = None
+
+    def add(self, event):
+        self.calls += 1
+        self.seconds += event.seconds
+        self.pixels += event.pixels
+        self.bytes += event.bytes
+        if event.allocated is not None:
+            self.allocated = max(self.allocated or 0, event.allocated)
+
+    def as_dict(self):
+        return {
+            "calls": self.calls,
+            "seconds": self.seconds,
+            "pixels": self.pixels,
+            "bytes": self.bytes,
+            "pixels_per_second": self.pixels / self.seconds if self.seconds else 0.0,
+            "allocated": self.allocated,
+        }
+
+class Instrumentation:
+    """
+    Context manager collecting per-stage totals of the instrumented calls
+    made while it is active, in any thread
+    - memory: trace allocations with tracemalloc, slows Python-heavy stages
+    - callback: also called with every StageEvent
+
+    Stages are pattern (pattern synthesis), csc, resample (chroma
+    resampling), pack (matrix to AXIS or beats), unpack (AXIS to matrix),
+    and generate and convert for the rest of GenAXIStream and
+    ConvertAXIStreamCS. Times exclude nested stages, so they add up to the
+    total. Peak memory is global to the process and only exact for
+    single-threaded use.
+
+        with Instrumentation() as inst:
+            GenAXIStream(3840, 2160, 2, 10, Pattern.color_bars, ColorFormat.YUV422)
+        inst.dump("stages.json")
+    """
+    def __init__(self, memory=False, callback=None):
+        self.memory = memory
+        self.callback = callback
+        self.stages = {}
+        self._lock = threading.Lock()
+        self._started = False
+
+    def _record(self, event):
+        with self._lock:
+            self.stages.setdefault(event.stage, StageStats()).add(event)
+        if self.callback is not None:
+            self.callback(event)
+
+    def __enter__(self):
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started = True
+        add_hook(self._record)
+        return self
+
+    def __exit__(self, *exc):
+        remove_hook(self._record)
+        if self._started:
+            tracemalloc.stop()
+            self._started = False
+        return False
+
+    def as_dict(self):
+        """
+        - returns: {stage: {calls, seconds, pixels, bytes, pixels_per_second,
+          allocated}}
+        """
+        return {stage: stats.as_dict() for stage, stats in sorted(self.stages.items())}
+
+    def dump(self, path):
+        """ writes as_dict to path as JSON"""
+        with open(path, "w") as f:
+            json.dump(self.as_dict(), f, indent=1, sort_keys=True)
+
+    def __str__(self):
+        return "\n".join("%-10s %6d calls %9.4f s %10.2f Mpix/s" % (stage, s["calls"], s["seconds"],
+            s["pixels_per_second"] / 1e6) for stage, s in self.as_dict().items())
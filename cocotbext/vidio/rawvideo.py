@@ -0,0 +1,234 @@
+""" Raw video file input/output"""
+
+import numpy as np
+
+from .constants import ColorFormat, RawFormat
+from .utils import mat2axis, axis2mat, _check_order, _FROM_BUS, _TO_BUS
+
+# colour format and bit depth of the samples stored in each raw format
+_FORMATS = {
+    RawFormat.I420: (ColorFormat.YUV420, 8),
+    RawFormat.NV12: (ColorFormat.YUV420, 8),
+    RawFormat.P010: (ColorFormat.YUV420, 10),
+    RawFormat.GBRP10: (ColorFormat.RGB, 10),
+    RawFormat.V210: (ColorFormat.YUV422, 10),
+}
+
+def _v210_stride(resH):
+    """ bytes per v210 line, 48 pixels per 128 bytes"""
+    return -(-resH // 48) * 128
+
+def raw_frame_size(fmt, resH, resV):
+    """
+    - returns: size in bytes of one frame
+    - fmt: RawFormat
+    """
+    if fmt == RawFormat.I420 or fmt == RawFormat.NV12:
+        return resH*resV + 2*(resH//2)*(resV//2)
+    elif fmt == RawFormat.P010:
+        return 2*(resH*resV + 2*(resH//2)*(resV//2))
+    elif fmt == RawFormat.GBRP10:
+        return 2*3*resH*resV
+    elif fmt == RawFormat.V210:
+        return _v210_stride(resH)*resV
+    raise ValueError("Unknown RawFormat")
+
+def _decode(buf, fmt, resH, resV):
+    """ raw frame bytes to matrix of shape (resV, resH, 3), in mat2axis order"""
+    c, r = resH, resV
+    mat = np.zeros((r, c, 3), dtype=np.uint16)
+    if fmt == RawFormat.GBRP10:
+        # G, B, R planes are already in bus order
+        mat[...] = np.moveaxis(buf.view('<u2').reshape(3, r, c), 0, -1)
+    elif fmt == RawFormat.V210:
+        groups = -(-c // 6)
+        words = buf.reshape(r, -1)[:, :groups*16].view('<u4').reshape(r, groups, 4)
+        comps = (words[..., None] >> np.array([0, 10, 20], dtype=np.uint32)) & 0x3ff
+        comps = comps.reshape(r, groups*12)
+        # Cb0 Y0 Cr0 Y1 Cb1 Y2 Cr1 Y3 Cb2 Y4 Cr2 Y5
+        mat[:, :, 0] = comps[:, 1::2][:, :c]
+        mat[:, 0::2, 1] = comps[:, 0::4][:, :(c+1)//2]
+        mat[:, 0::2, 2] = comps[:, 2::4][:, :(c+1)//2]
+    else:
+        dtype = '<u2' if fmt == RawFormat.P010 else np.uint8
+        samples = buf.view(dtype)
+        if fmt == RawFormat.P010:
+            samples = samples >> 6
+        luma = r*c
+        chroma = (r//2)*(c//2)
+        mat[:, :, 0] = samples[:luma].reshape(r, c)
+        if fmt == RawFormat.I420:
+            mat[0:r//2*2:2, 0:c//2*2:2, 1] = samples[luma:luma+chroma].reshape(r//2, c//2)
+            mat[0:r//2*2:2, 0:c//2*2:2, 2] = samples[luma+chroma:luma+2*chroma].reshape(r//2, c//2)
+        else:
+            uv = samples[luma:luma+2*chroma].reshape(r//2, c//2, 2)
+            mat[0:r//2*2:2, 0:c//2*2:2, 1:] = uv
+    return mat
+
+def _encode(mat, buf, fmt, resH, resV):
+    """ matrix of shape (resV, resH, 3), in mat2axis order, to raw frame bytes"""
+    c, r = resH, resV
+    if fmt == RawFormat.GBRP10:
+        buf.view('<u2').reshape(3, r, c)[...] = np.moveaxis(mat, -1, 0)
+    elif fmt == RawFormat.V210:
+        groups = -(-c // 6)
+        comps = np.zeros((r, groups*12), dtype=np.uint32)
+        comps[:, 1::2][:, :c] = mat[:, :, 0]
+        comps[:, 0::4][:, :(c+1)//2] = mat[:, 0::2, 1]
+        comps[:, 2::4][:, :(c+1)//2] = mat[:, 0::2, 2]
+        comps = comps.reshape(r, groups, 4, 3) & 0x3ff
+        words = comps[..., 0] | (comps[..., 1] << 10) | (comps[..., 2] << 20)
+        lines = buf.reshape(r, -1)
+        lines[:, groups*16:] = 0
+        lines[:, :groups*16].view('<u4').reshape(r, groups, 4)[...] = words
+    else:
+        dtype = '<u2' if fmt == RawFormat.P010 else np.uint8
+        shift = 6 if fmt == RawFormat.P010 else 0
+        samples = buf.view(dtype)
+        luma = r*c
+        chroma = (r//2)*(c//2)
+        samples[:luma].reshape(r, c)[...] = mat[:, :, 0] << shift
+        sub = mat[0:r//2*2:2, 0:c//2*2:2]
+        if fmt == RawFormat.I420:
+            samples[luma:luma+chroma].reshape(r//2, c//2)[...] = sub[:, :, 1]
+            samples[luma+chroma:luma+2*chroma].reshape(r//2, c//2)[...] = sub[:, :, 2]
+        else:
+            samples[luma:luma+2*chroma].reshape(r//2, c//2, 2)[...] = sub[:, :, 1:] << shift
+
+class RawVideoReader:
+    """
+    Reads frames from a raw video file through a memory map, one frame at a time
+    - path: file name
+    - fmt: RawFormat
+    - resH: Horizontal resoltuion, >1
+    - resV: Vertixal resolution, >1
+    - pixelQuant: Quantization of the returned samples, default the depth
+      stored in the file; samples are shifted to match
+    - order: channel order of RGB matrices, "rgb" for R, G, B as axis2mat
+      and VideoSink return them, or "bus" for G, B, R as mat2axis and the
+      GenAXIStream references use; same argument as RawVideoWriter
+
+        reader = RawVideoReader("clip.yuv", RawFormat.I420, 1920, 1080, pixelQuant=10)
+        for i in range(len(reader)):
+            for line in reader.read_axis(i, 2):
+                await source.send(line)
+    """
+    def __init__(self, path, fmt, resH, resV, pixelQuant=None, order="rgb"):
+        self.fmt = fmt
+        self.resH = resH
+        self.resV = resV
+        self.colorFormat, self.depth = _FORMATS[fmt]
+        self.pixelQuant = self.depth if pixelQuant is None else pixelQuant
+        self.order = _check_order(order)
+        self.frame_bytes = raw_frame_size(fmt, resH, resV)
+        self._map = np.memmap(path, dtype=np.uint8, mode='r')
+        self.frames = len(self._map) // self.frame_bytes
+
+    def __len__(self):
+        return self.frames
+
+    def __iter__(self):
+        for i in range(self.frames):
+            yield self.read(i)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self._map = None
+
+    def read(self, index):
+        """
+        - returns: frame index as numpy array of shape (resV*resH, 3), dtype uint16
+        """
+        mat = self._read(index)
+        if self.colorFormat == ColorFormat.RGB and self.order == "rgb":
+            mat = mat[:, _FROM_BUS]
+        return mat
+
+    def _read(self, index):
+        """ frame index in bus order"""
+        if not 0 <= index < self.frames:
+            raise IndexError("Frame %d out of range" % index)
+        buf = self._map[index*self.frame_bytes:(index+1)*self.frame_bytes]
+        mat = _decode(buf, self.fmt, self.resH, self.resV)
+        if self.pixelQuant > self.depth:
+            mat <<= self.pixelQuant - self.depth
+        elif self.pixelQuant < self.depth:
+            mat >>= self.depth - self.pixelQuant
+        return np.reshape(mat, (self.resV*self.resH, 3))
+
+    def read_axis(self, index, pixelPerClock):
+        """
+        - returns: AXIS transaction for frame index
+        """
+        return mat2axis(self._read(index), self.resH, pixelPerClock, self.pixelQuant, self.colorFormat)
+
+class RawVideoWriter:
+    """
+    Writes frames to a raw video file, each frame straight into a memory map
+    of its place in the file
+    - path: file name, truncated on open
+    - fmt: RawFormat
+    - resH: Horizontal resoltuion, >1
+    - resV: Vertixal resolution, >1
+    - pixelQuant: Quantization of the written samples, default the depth
+      stored in the file; samples are shifted to match
+    - order: channel order of RGB matrices, "rgb" or "bus", see
+      RawVideoReader
+    """
+    def __init__(self, path, fmt, resH, resV, pixelQuant=None, order="rgb"):
+        self.fmt = fmt
+        self.resH = resH
+        self.resV = resV
+        self.colorFormat, self.depth = _FORMATS[fmt]
+        self.pixelQuant = self.depth if pixelQuant is None else pixelQuant
+        self.order = _check_order(order)
+        self.frame_bytes = raw_frame_size(fmt, resH, resV)
+        self.frames = 0
+        self._file = open(path, 'wb+')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def write(self, mat):
+        """
+        appends one frame
+        - mat: numpy array of shape (resV*resH, 3), e.g. from axis2mat or
+          VideoSink, in order
+        """
+        self._write(mat, self.order)
+
+    def _write(self, mat, order):
+        mat = np.reshape(np.asarray(mat), (self.resV, self.resH, 3)).astype(np.uint16)
+        if self.colorFormat == ColorFormat.RGB and order == "rgb":
+            mat = mat[:, :, _TO_BUS]
+        if self.pixelQuant > self.depth:
+            mat >>= self.pixelQuant - self.depth
+        elif self.pixelQuant < self.depth:
+            mat <<= self.depth - self.pixelQuant
+
+        offset = self.frames*self.frame_bytes
+        self._file.truncate(offset + self.frame_bytes)
+        buf = np.memmap(self._file, dtype=np.uint8, mode='r+', offset=offset, shape=(self.frame_bytes,))
+        _encode(mat, buf, self.fmt, self.resH, self.resV)
+        buf.flush()
+        del buf
+        self.frames += 1
+
+    def write_axis(self, axisFrame, pixelPerClock):
+        """
+        appends one frame received as AXIS
+        """
+        self._write(axis2mat(axisFrame, self.resH, pixelPerClock, self.pixelQuant, self.colorFormat), "rgb")
@@ -0,0 +1,118 @@
+""" Chroma resampling"""
+
+import numpy as np
+
+from .constants import ColorFormat
+from .frame import VideoFrame, chroma_shape
+from .instrument import instrumented, produced
+
+# default separable filters, integer taps normalised by their sum
+DOWN_TAPS = (1, 2, 1)
+UP_TAPS = (1, 1)
+
+# chroma subsampling of each format as (horizontal, vertical)
+_SUBSAMPLING = {
+    ColorFormat.YUV444: (False, False),
+    ColorFormat.YUV422: (True, False),
+    ColorFormat.YUV420: (True, True),
+}
+
+def _normalise(acc, taps, rounding):
+    """ divides acc in place by the sum of taps"""
+    total = int(sum(taps))
+    if total <= 0:
+        raise ValueError("Filter taps must have a positive sum")
+    if rounding:
+        acc += total // 2
+    if total & (total - 1) == 0:
+        acc >>= total.bit_length() - 1
+    else:
+        acc //= total
+    return acc
+
+def _along(axis, index):
+    """ index tuple selecting index along axis of a plane"""
+    return (slice(None),)*axis + (index,)
+
+def _fir(plane, taps, axis, start, step, count, rounding):
+    """
+    filters plane along axis, output i is sum(taps[k] * plane[start + i*step + k]),
+    samples outside the plane repeat the outermost one
+    """
+    n = plane.shape[axis]
+    before = max(0, -start)
+    after = max(0, start + (count - 1)*step + len(taps) - n)
+    pad = [(0, 0)]*plane.ndim
+    pad[axis] = (before, after)
+    padded = np.pad(plane, pad, mode='edge')
+    start += before
+    acc = None
+    for k, t in enumerate(taps):
+        taps_view = padded[_along(axis, slice(start + k, start + k + (count - 1)*step + 1, step))]
+        if acc is None:
+            acc = np.multiply(taps_view, int(t), dtype=np.int32)
+        elif t == 1:
+            acc += taps_view
+        elif t:
+            acc += np.multiply(taps_view, int(t), dtype=np.int32)
+    return _normalise(acc, taps, rounding)
+
+def _decimate(plane, taps, axis, rounding):
+    """ filters plane along axis and keeps the even (co-sited) samples"""
+    count = (plane.shape[axis] + 1) // 2
+    return _fir(plane, taps, axis, -((len(taps) - 1) // 2), 2, count, rounding)
+
+def _interpolate(plane, taps, axis, size, rounding):
+    """
+    doubles plane along axis to size samples, even samples are copied and
+    odd samples are filtered from the neighbouring ones
+    """
+    shape = list(plane.shape)
+    shape[axis] = size
+    out = np.empty(shape, dtype=np.int32)
+    out[_along(axis, slice(0, None, 2))] = plane[_along(axis, slice(0, (size + 1) // 2))]
+    out[_along(axis, slice(1, None, 2))] = _fir(plane, taps, axis, 1 - len(taps) // 2, 1, size // 2, rounding)
+    return out
+
+@instrumented("resample", produced)
+def resample_chroma(frame, outFormat, hTaps=None, vTaps=None, rounding=True):
+    """
+    converts the chroma planes of a YUV VideoFrame between 4:4:4, 4:2:2 and 4:2:0
+    - frame: VideoFrame, YUV444, YUV422 or YUV420
+    - outFormat: YUV444, YUV422, YUV420
+    - hTaps: integer taps of the horizontal filter, normalised by their sum;
+      default DOWN_TAPS when decimating and UP_TAPS when interpolating
+    - vTaps: integer taps of the vertical filter, same defaults
+    - rounding: round to nearest after normalising, otherwise truncate
+    - returns: new VideoFrame, the input frame is not modified
+
+    Chroma is co-sited with the even pixels and lines. Decimation filters
+    are centred on the kept sample, interpolation filters (even length)
+    on the gap between two samples. Edges repeat the outermost sample.
+    """
+    if frame.format not in _SUBSAMPLING or outFormat not in _SUBSAMPLING:
+        raise ValueError("Unsupported ColorFormat, chroma resampling needs YUV")
+    in_h, in_v = _SUBSAMPLING[frame.format]
+    out_h, out_v = _SUBSAMPLING[outFormat]
+    maxval = (1 << frame.pixelQuant) - 1
+    rows, cols = chroma_shape(frame.resH, frame.resV, ColorFormat.YUV444)
+
+    planes = [frame.planes[0].copy()]
+    for plane in frame.planes[1:]:
+        taps = []
+        if in_v and not out_v:
+            taps.append(vTaps or UP_TAPS)
+            plane = _interpolate(plane, taps[-1], 0, rows, rounding)
+        if in_h and not out_h:
+            taps.append(hTaps or UP_TAPS)
+            plane = _interpolate(plane, taps[-1], 1, cols, rounding)
+        if out_h and not in_h:
+            taps.append(hTaps or DOWN_TAPS)
+            plane = _decimate(plane, taps[-1], 1, rounding)
+        if out_v and not in_v:
+            taps.append(vTaps or DOWN_TAPS)
+            plane = _decimate(plane, taps[-1], 0, rounding)
+        if any(min(t) < 0 for t in taps):
+            plane = np.clip(plane, 0, maxval)
+        planes.append(np.ascontiguousarray(plane, dtype=np.uint16))
+    return VideoFrame(planes, frame.resH, frame.resV, outFormat, frame.pixelQuant, frame.standard)
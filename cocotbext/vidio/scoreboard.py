@@ -0,0 +1,132 @@
+""" Frame scoreboard"""
+
+import logging
+import numpy as np
+
+from .constants import ColorFormat
+from .utils import _check_order, _FROM_BUS
+
+def _channel_names(format):
+    """ names of the compared channels of format, None for plain indices"""
+    if format is None:
+        return None
+    return ("R", "G", "B") if format == ColorFormat.RGB else ("Y", "U", "V")
+
+class CompareResult:
+    """
+    Result of comparing one frame
+    - mismatches: number of components outside tolerance
+    - first: (line, pixel, channel) of the first mismatch, None if none;
+      channel is a name such as "G" when the format is known, else an index
+    - worst: (line, pixel, channel) of the largest difference, None if none
+    - max_diff: largest absolute difference
+    - psnr: PSNR in dB per plane, inf for identical planes
+    """
+    __slots__ = ("mismatches", "first", "worst", "max_diff", "psnr")
+
+    def __init__(self, mismatches, first, worst, max_diff, psnr):
+        self.mismatches = mismatches
+        self.first = first
+        self.worst = worst
+        self.max_diff = max_diff
+        self.psnr = psnr
+
+    def __bool__(self):
+        return self.mismatches == 0
+
+    def __str__(self):
+        if not self.mismatches:
+            return "frame matches"
+        return "%d mismatches, first at (line, pixel, channel) %s, worst %s by %d, psnr %s" % (
+            self.mismatches, self.first, self.worst, self.max_diff,
+            ", ".join("%.2f" % p for p in self.psnr))
+
+def compare_frames(expected, actual, resH, pixelQuant=10, tolerance=0, format=None, order="bus"):
+    """
+    compares two frames at once
+    - expected: numpy array of shape (r*c, 3), e.g. from GenAXIStream
+    - actual: numpy array of shape (r*c, 3), e.g. from axis2mat
+    - resH: Horizontal resoltuion, >1
+    - pixelQuant: Quantization, 10
+    - tolerance: allowed absolute difference, scalar or one per channel
+      in the order of actual
+    - format: RGB, YUV444, YUV422, YUV420, names the channels of the
+      result; with RGB expected is reordered to the R, G, B of actual
+    - order: channel order of an RGB expected, "bus" for G, B, R as
+      GenAXIStream returns it, or "rgb"; actual is R, G, B as axis2mat and
+      VideoSink return it
+    - returns: CompareResult
+    """
+    expected = np.asarray(expected)
+    actual = np.asarray(actual)
+    if format == ColorFormat.RGB and _check_order(order) == "bus":
+        expected = np.reshape(expected, (-1, 3))[:, _FROM_BUS]
+    names = _channel_names(format)
+    if expected.shape != actual.shape:
+        raise ValueError("Frame shape mismatch, expected %s got %s" % (expected.shape, actual.shape))
+    diff = np.reshape(np.subtract(actual, expected, dtype=np.int32, casting="unsafe"), (-1, 3))
+    np.abs(diff, out=diff)
+    if not np.count_nonzero(diff):
+        return CompareResult(0, None, None, 0, (float("inf"),)*3)
+
+    # only differing components contribute to the error, visit just those
+    idx = np.flatnonzero(diff)
+    err = diff.ravel()[idx]
+    sse = np.bincount(idx % 3, weights=np.square(err, dtype=np.float64), minlength=3)
+    peak = float((1 << pixelQuant) - 1)
+    with np.errstate(divide="ignore"):
+        psnr = tuple(float(p) for p in 10*np.log10(peak*peak*diff.shape[0] / sse))
+
+    tol = np.broadcast_to(np.asarray(tolerance, dtype=np.int32), (3,))
+    bad = err > tol[idx % 3]
+    mismatches = int(np.count_nonzero(bad))
+    if not mismatches:
+        return CompareResult(0, None, None, int(err.max()), psnr)
+
+    def locate(i):
+        pixel, channel = divmod(int(i), 3)
+        return (pixel // resH, pixel % resH, channel if names is None else names[channel])
+
+    worst = np.argmax(np.where(bad, err, -1))
+    return CompareResult(mismatches, locate(idx[np.argmax(bad)]), locate(idx[worst]), int(err[worst]), psnr)
+
+class Scoreboard:
+    """
+    Compares every frame of a test against its reference
+    - resH: Horizontal resoltuion, >1
+    - pixelQuant: Quantization, 10
+    - tolerance: allowed absolute difference, scalar or one per channel,
+      e.g. 1 to absorb the rounding in csc.rgb2yuv
+    - format, order: format of the frames and channel order of RGB
+      references, see compare_frames
+
+    Only counters and the first failing result are kept, so memory does
+    not grow with the number of frames.
+    """
+    def __init__(self, resH, pixelQuant=10, tolerance=0, log=None, format=None, order="bus"):
+        self.resH = resH
+        self.pixelQuant = pixelQuant
+        self.tolerance = tolerance
+        self.format = format
+        self.order = _check_order(order)
+        self.log = log or logging.getLogger("cocotb.vidio.scoreboard")
+        self.frames = 0
+        self.failures = 0
+        self.first_failure = None
+
+    def compare(self, expected, actual):
+        """
+        - returns: CompareResult, also logged as an error on mismatch
+        """
+        result = compare_frames(expected, actual, self.resH, self.pixelQuant, self.tolerance,
+            self.format, self.order)
+        if not result:
+            self.failures += 1
+            if self.first_failure is None:
+                self.first_failure = (self.frames, result)
+            self.log.error("Frame %d: %s", self.frames, result)
+        self.frames += 1
+        return result
+
+    def passed(self):
+        return self.frames > 0 and self.failures == 0
@@ -0,0 +1,176 @@
+""" Parallel frame sequence generation"""
+
+import collections
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .constants import Pattern, Standard
+from .tpg import pattern_frame, chroma_mask
+from .utils import _pack_frame, _words_to_axis, packing_layout, mat2axis
+
+def _layout(resH, resV, pixelPerClock, pixelQuant, format):
+    """ shapes of the packed words and of the reference in a frame buffer"""
+    layout = packing_layout(format, pixelPerClock, pixelQuant)
+    return (resV, resH // layout.unit, layout.nwords), (resV*resH, 3)
+
+def _reference(resH, resV, pixelQuant, pattern, format, seed, frameIndex, standard):
+    """ reference matrix of one frame, rand frames are drawn from a RandomState seeded with seed"""
+    rng = np.random.RandomState(seed) if pattern == Pattern.rand else None
+    rgb = np.reshape(pattern_frame(resH, resV, pixelQuant, pattern, seed=seed, frameIndex=frameIndex,
+        format=format, standard=standard, rng=rng), (resV*resH, 3))
+    rgb[chroma_mask(resH, resV, format), 1:] = 0
+    return rgb
+
+def _render(name, resH, resV, pixelPerClock, pixelQuant, pattern, format, seed, frameIndex, standard):
+    """ worker: generates and packs one frame into the shared memory block name"""
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        words_shape, ref_shape = _layout(resH, resV, pixelPerClock, pixelQuant, format)
+        words = np.ndarray(words_shape, dtype='<u8', buffer=shm.buf)
+        ref = np.ndarray(ref_shape, dtype=np.uint16, buffer=shm.buf, offset=words.nbytes)
+        rgb = _reference(resH, resV, pixelQuant, pattern, format, seed, frameIndex, standard)
+        ref[...] = rgb
+        words[...] = _pack_frame(rgb, resH, pixelPerClock, pixelQuant, format)
+        del words, ref
+    finally:
+        shm.close()
+
+def GenAXIStreamSequence(resH, resV, pixelPerClock, pixelQuant, pattern, format, frames, workers=None, seed=0,
+        compact=False, standard=Standard.BT2020, incremental=False):
+    """
+    - returns: generator of (axis, reference) for frames frames, in order,
+      each as returned by GenAXIStream with a uint16 reference matrix
+    - resh: Horizontal resoltuion, >1
+    - resv: Vertixal resolution, >1
+    - pixelperclock: Pixel per clock in AXI transaction, [1, 2, 4, 8]
+    - pixelquant: Quantization, 10
+    - pattern: any Pattern, see GenAXIStream
+    - format: RGB, YUV444, YUV422, YUV420
+    - frames: number of frames
+    - workers: number of worker processes, default os.cpu_count()
+    - seed: key of the seeded pattern, frame i is the one GenAXIStream
+      returns for frameIndex=i
+    - compact: compact tuser sideband, see mat2axis
+    - standard: BT601, BT709, BT2020, see GenAXIStream
+    - incremental: generate frames in this process and repack only the
+      lines that changed since the previous frame, see DirtyLinePacker;
+      workers is ignored
+
+    Frames are generated and packed by a ProcessPoolExecutor, up to two per
+    worker ahead of the consumer. Workers write into shared memory blocks
+    that are reused for later frames, so only the block name is pickled.
+    Random frames are seeded from np.random in frame order, the sequence is
+    the same for any number of workers.
+
+        video = VideoSource(source, GenAXIStreamSequence(1920, 1080, 2, 10, Pattern.rand,
+            ColorFormat.RGB, 600, workers=8).__next__, frames=600)
+    """
+    if incremental:
+        return _incremental(resH, resV, pixelPerClock, pixelQuant, pattern, format, frames, seed, compact, standard)
+    return _parallel(resH, resV, pixelPerClock, pixelQuant, pattern, format, frames, workers, seed, compact, standard)
+
+def _frame_seed(pattern, seed):
+    """ seed of the next frame, rand frames draw theirs from np.random in frame order"""
+    return int(np.random.randint(2**32)) if pattern == Pattern.rand else seed
+
+def _incremental(resH, resV, pixelPerClock, pixelQuant, pattern, format, frames, seed, compact, standard):
+    """ serial sequence, each frame repacked from the previous one"""
+    packer = DirtyLinePacker(resH, pixelPerClock, pixelQuant, format, compact)
+    for i in range(frames):
+        ref = _reference(resH, resV, pixelQuant, pattern, format, _frame_seed(pattern, seed), i, standard)
+        yield packer.pack(ref), ref.astype(np.uint16)
+
+def _parallel(resH, resV, pixelPerClock, pixelQuant, pattern, format, frames, workers, seed, compact, standard):
+    """ frames generated and packed by a process pool, delivered in order"""
+    workers = workers or os.cpu_count() or 1
+    words_shape, ref_shape = _layout(resH, resV, pixelPerClock, pixelQuant, format)
+    layout = packing_layout(format, pixelPerClock, pixelQuant)
+    size = 8*int(np.prod(words_shape)) + 2*int(np.prod(ref_shape))
+    blocks = []
+    pending = collections.deque()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for i in range(frames):
+                if len(blocks) < 2*workers:
+                    shm = shared_memory.SharedMemory(create=True, size=size)
+                    blocks.append(shm)
+                else:
+                    # reuse the block of the oldest frame once it is delivered
+                    shm, future = pending.popleft()
+                    future.result()
+                    yield _collect(shm, words_shape, ref_shape, layout, compact)
+                pending.append((shm, pool.submit(_render, shm.name, resH, resV, pixelPerClock,
+                    pixelQuant, pattern, format, _frame_seed(pattern, seed), i, standard)))
+            while pending:
+                shm, future = pending.popleft()
+                future.result()
+                yield _collect(shm, words_shape, ref_shape, layout, compact)
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+def _collect(shm, words_shape, ref_shape, layout, compact):
+    """ copies a finished frame out of its shared memory block"""
+    words = np.ndarray(words_shape, dtype='<u8', buffer=shm.buf)
+    ref = np.ndarray(ref_shape, dtype=np.uint16, buffer=shm.buf, offset=words.nbytes).copy()
+    axis = _words_to_axis(words, layout, compact=compact)
+    del words
+    return axis, ref
+
+class DirtyLinePacker:
+    """
+    Packs a sequence of frames, repacking only the lines that differ from
+    the previous frame
+    - resH: Horizontal resoltuion, >1
+    - pixelPerClock: Pixel per clock in AXI transaction, [1, 2, 4, 8]
+    - pixelQuant: bits per component, 8, 10, 12, 16
+    - format: RGB, YUV444, YUV422, YUV420
+    - compact: compact tuser sideband, see mat2axis
+
+    Frames are compared with the previous one line by line. Runs of changed
+    lines are packed with mat2axis, unchanged lines are the AxiStreamFrame
+    objects, and tdata buffers, of the previous frame. AxiStreamSource.send
+    copies every line, so sharing them between frames is safe as long as
+    they are not modified in place. repacked counts the lines packed so far.
+
+        packer = DirtyLinePacker(1920, 2, 10, ColorFormat.YUV422)
+        for mat in frames:
+            for line in packer.pack(mat):
+                await source.send(line)
+    """
+    def __init__(self, resH, pixelPerClock, pixelQuant, format, compact=False):
+        self.resH = resH
+        self.pixelPerClock = pixelPerClock
+        self.pixelQuant = pixelQuant
+        self.format = format
+        self.compact = compact
+        self.repacked = 0
+        self._prev = None
+        self._lines = None
+
+    def pack(self, matrix):
+        """
+        - matrix: numpy array of shape (resV*resH, 3) of the next frame
+        - returns: list of AxiStreamFrame, one per line, as mat2axis
+        """
+        rows = np.reshape(matrix, (-1, self.resH*3))
+        if self._prev is None or self._prev.shape != rows.shape:
+            dirty = np.arange(rows.shape[0])
+            self._prev = rows.copy()
+            self._lines = [None]*rows.shape[0]
+        else:
+            dirty = np.flatnonzero((rows != self._prev).any(axis=1))
+            self._prev[dirty] = rows[dirty]
+        lines = self._lines
+        for run in np.split(dirty, np.flatnonzero(np.diff(dirty) != 1) + 1):
+            if not run.size:
+                continue
+            first, last = int(run[0]), int(run[-1]) + 1
+            lines[first:last] = mat2axis(rows[first:last].reshape(-1, 3), self.resH, self.pixelPerClock,
+                self.pixelQuant, self.format, firstLine=first, compact=self.compact)
+        self.repacked += dirty.size
+        return list(lines)
@@ -0,0 +1,69 @@
+""" Line and frame signatures"""
+
+import zlib
+import numpy as np
+
+from .utils import axis2mat, BeatArray
+
+class FrameSignature:
+    """
+    CRC32 of the packed tdata of every line of a frame
+    - lines: numpy array of shape (r,), dtype uint32
+    - frame: CRC32 over the line signatures
+    """
+    __slots__ = ("lines", "frame")
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.frame = zlib.crc32(lines.tobytes())
+
+    def __eq__(self, other):
+        if not isinstance(other, FrameSignature):
+            return NotImplemented
+        return self.frame == other.frame and np.array_equal(self.lines, other.lines)
+
+    def __len__(self):
+        return len(self.lines)
+
+    def __repr__(self):
+        return "FrameSignature(lines=%d, frame=0x%08x)" % (len(self.lines), self.frame)
+
+    def diff(self, other):
+        """
+        - returns: indices of the lines whose signatures differ, lines missing
+          from either side count as different
+        """
+        n = min(len(self.lines), len(other.lines))
+        lines = np.flatnonzero(self.lines[:n] != other.lines[:n])
+        return np.concatenate([lines, np.arange(n, max(len(self.lines), len(other.lines)))])
+
+def frame_signature(axisFrame):
+    """
+    - axisFrame: list of cocotbext.axi.AxiStreamFrame, one per line, or a BeatArray
+    - returns: FrameSignature
+    """
+    if isinstance(axisFrame, BeatArray):
+        return FrameSignature(np.fromiter((zlib.crc32(axisFrame.line(j)) for j in range(axisFrame.lines)),
+            dtype=np.uint32, count=axisFrame.lines))
+    lines = np.fromiter((zlib.crc32(line.tdata) for line in axisFrame), dtype=np.uint32, count=len(axisFrame))
+    return FrameSignature(lines)
+
+def check_signature(axisFrame, expected, resH, pixelPerClock, pixelQuant, fmt):
+    """
+    compares received lines against an expected signature, decoding only the
+    lines that differ
+    - axisFrame: list of cocotbext.axi.AxiStreamFrame, one per line
+    - expected: FrameSignature, e.g. from GenAXIStream(..., signature=True)
+    - returns: dict of line number to decoded (resH, 3) matrix for every
+      mismatching line, empty when the frame matches
+    """
+    received = frame_signature(axisFrame)
+    if received == expected:
+        return {}
+    bad = {}
+    for i in received.diff(expected):
+        if i < len(axisFrame):
+            bad[int(i)] = axis2mat([axisFrame[i]], resH, pixelPerClock, pixelQuant, fmt, firstLine=int(i))
+        else:
+            bad[int(i)] = None
+    return bad
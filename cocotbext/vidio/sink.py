@@ -0,0 +1,125 @@
+""" Video sink"""
+
+import numpy as np
+import cocotb
+from cocotb.queue import Queue
+
+from .utils import axis2mat, packing_layout
+
+class VideoSink:
+    """
+    Receives frames from a cocotbext.axi.AxiStreamSink, decoding every line
+    into a preallocated frame buffer as soon as it arrives
+    - sink: cocotbext.axi.AxiStreamSink, one AxiStreamFrame per line (tlast)
+    - resH: Horizontal resoltuion, >1
+    - resV: Vertixal resolution, >1
+    - pixelPerClock: Pixel per clock in AXI transaction, [1, 2, 4, 8]
+    - pixelQuant: Quantization, 10
+    - fmt: RGB, YUV444, YUV422, YUV420
+
+    Start of frame is taken from tuser on the first beat of a line. Lines
+    received before the first start of frame, or frames cut short by an
+    early start of frame, are counted in dropped_lines. A line whose tdata
+    is not the packed line length is counted in malformed_lines and drops
+    the frame it belongs to, as do the lines that follow it up to the next
+    start of frame.
+
+        video = VideoSink(AxiStreamSink(...), 1920, 1080, 2, 10, ColorFormat.YUV422)
+        video.start()
+        mat = await video.recv()
+    """
+    def __init__(self, sink, resH, resV, pixelPerClock, pixelQuant, fmt):
+        self.sink = sink
+        self.resH = resH
+        self.resV = resV
+        self.pixelPerClock = pixelPerClock
+        self.pixelQuant = pixelQuant
+        self.fmt = fmt
+        self.queue = Queue()
+        self.line = 0
+        self.frames = 0
+        self.dropped_lines = 0
+        self.malformed_lines = 0
+        self._line_bytes = packing_layout(fmt, pixelPerClock, pixelQuant).line_bytes(resH)
+        self._synced = False
+        self._frame = np.zeros((resV, resH, 3), dtype=np.int16 if pixelQuant < 16 else np.int32)
+        self._run_cr = None
+
+    def start(self):
+        """ starts decoding lines in the background"""
+        if self._run_cr is None:
+            self._run_cr = cocotb.start_soon(self._run())
+
+    def stop(self):
+        if self._run_cr is not None:
+            self._run_cr.kill()
+            self._run_cr = None
+
+    async def _run(self):
+        while True:
+            line = await self.sink.recv()
+            frame = self.feed(line)
+            if frame is not None:
+                self.queue.put_nowait(frame)
+
+    async def recv(self):
+        """
+        - returns: next completed frame, numpy array of shape (resV*resH, 3)
+        """
+        return await self.queue.get()
+
+    def recv_nowait(self):
+        return self.queue.get_nowait()
+
+    def count(self):
+        return self.queue.qsize()
+
+    def empty(self):
+        return self.queue.empty()
+
+    def feed(self, line):
+        """
+        decodes one received line
+        - line: cocotbext.axi.AxiStreamFrame
+        - returns: completed frame, numpy array of shape (resV*resH, 3), or None
+        """
+        sof = _start_of_frame(line)
+        if sof is None:
+            # no tuser on the bus, frames are delimited by line count only
+            self._synced = True
+        elif sof:
+            if self.line:
+                self.dropped_lines += self.line
+                self.line = 0
+            self._synced = True
+        elif not self._synced:
+            self.dropped_lines += 1
+            return None
+
+        if len(line.tdata) != self._line_bytes:
+            self.malformed_lines += 1
+            self.dropped_lines += self.line + 1
+            self.line = 0
+            self._synced = sof is None
+            return None
+
+        axis2mat(line.tdata, self.resH, self.pixelPerClock, self.pixelQuant, self.fmt,
+            firstLine=self.line, out=self._frame[self.line:self.line+1])
+        self.line += 1
+        if self.line < self.resV:
+            return None
+
+        frame = np.reshape(self._frame, (self.resV*self.resH, 3))
+        self._frame = np.zeros((self.resV, self.resH, 3), dtype=self._frame.dtype)
+        self.line = 0
+        self._synced = sof is None
+        self.frames += 1
+        return frame
+
+def _start_of_frame(line):
+    tuser = line.tuser
+    if tuser is None:
+        return None
+    if isinstance(tuser, (list, tuple)):
+        return bool(tuser[0]) if tuser else None
+    return bool(tuser)
@@ -0,0 +1,153 @@
+""" Video source"""
+
+import queue
+import threading
+
+from cocotb.triggers import RisingEdge
+
+class VideoSource:
+    """
+    Drives frames through a cocotbext.axi.AxiStreamSource while upcoming
+    frames are generated in a background thread
+    - source: cocotbext.axi.AxiStreamSource
+    - generate: callable returning one frame, as (axis, matrix) or axis, e.g.
+      functools.partial(GenAXIStream, 1920, 1080, 2, 10, Pattern.rand, ColorFormat.RGB)
+    - frames: number of frames to generate, None for no limit
+    - depth: number of ready frames kept queued ahead of the simulator
+
+    underruns counts how often a frame was needed before the worker had one ready.
+
+    The worker thread shares the GIL with the simulator. Large numpy
+    operations release it, but building the AXIS lines and the rest of the
+    Python code in generate do not, so generation only partly overlaps
+    with simulation. For CPU-bound patterns generate frames in worker
+    processes with GenAXIStreamSequence and pass its __next__ as generate.
+
+        video = VideoSource(AxiStreamSource(...), generate, frames=10)
+        video.start()
+        for _ in range(10):
+            expected = await video.send_frame()
+    """
+    def __init__(self, source, generate, frames=None, depth=2):
+        self.source = source
+        self.generate = generate
+        self.frames = frames
+        self.queue = queue.Queue(maxsize=depth)
+        self.underruns = 0
+        self.generated = 0
+        self.sent = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._error = None
+
+    def start(self):
+        """ starts the worker thread"""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._worker, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """ stops the worker thread, frames already queued are dropped"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        while not self.queue.empty():
+            self.queue.get_nowait()
+
+    def _worker(self):
+        try:
+            while not self._stop.is_set():
+                if self.frames is not None and self.generated >= self.frames:
+                    break
+                frame = self.generate()
+                if not isinstance(frame, tuple):
+                    frame = (frame, None)
+                while not self._stop.is_set():
+                    try:
+                        self.queue.put(frame, timeout=0.1)
+                        break
+                    except queue.Full:
+                        pass
+                self.generated += 1
+        except Exception as e:
+            self._error = e
+
+    def done(self):
+        """ True once every frame has been generated and sent"""
+        return self.frames is not None and self.sent >= self.frames
+
+    def get_nowait(self):
+        """
+        - returns: next ready frame as (axis, matrix), None if none is ready
+        """
+        if self._error is not None:
+            raise self._error
+        try:
+            return self.queue.get_nowait()
+        except queue.Empty:
+            return None
+
+    async def send_frame(self):
+        """
+        queues every line of the next frame on the source
+        - returns: reference matrix of the frame, None if generate returns only axis
+        """
+        if self.done():
+            raise ValueError("All frames have been sent")
+        self.start()
+        frame = self.get_nowait()
+        if frame is None:
+            self.underruns += 1
+            while frame is None:
+                await RisingEdge(self.source.clock)
+                frame = self.get_nowait()
+        axis, matrix = frame
+
+        # keep at most one frame waiting in the source queue
+        while self.source.count() >= len(axis):
+            self.source.dequeue_event.clear()
+            await self.source.dequeue_event.wait()
+        for line in axis:
+            await self.source.send(line)
+        self.sent += 1
+        return matrix
+
+    async def run(self):
+        """ sends frames until the worker is exhausted"""
+        while not self.done():
+            await self.send_frame()
+        await self.source.wait()
+
+async def drive_beats(bus, clock, beats):
+    """
+    drives a BeatArray onto an AXI stream bus, one beat per clock while
+    tready is high
+    - bus: cocotbext.axi.AxiStreamBus or any object with tdata and tvalid
+      signals, and optionally tready, tuser, tlast and tkeep
+    - clock: clock signal
+    - beats: BeatArray, e.g. from GenAXIStream(..., beats=True)
+
+        axis, ref = GenAXIStream(3840, 2160, 4, 10, Pattern.rand, ColorFormat.RGB, beats=True)
+        await drive_beats(AxiStreamBus.from_prefix(dut, "s_axis"), dut.clk, axis)
+    """
+    tuser, tlast = beats.sideband()
+    data = beats.tdata.tobytes()
+    width = beats.beat_bytes
+    has_tready = hasattr(bus, "tready")
+    has_tuser = hasattr(bus, "tuser")
+    has_tlast = hasattr(bus, "tlast")
+    if hasattr(bus, "tkeep"):
+        bus.tkeep.value = (1 << width) - 1
+    for i in range(beats.num_beats):
+        bus.tdata.value = int.from_bytes(data[i*width:(i+1)*width], 'little')
+        if has_tuser:
+            bus.tuser.value = int(tuser[i])
+        if has_tlast:
+            bus.tlast.value = int(tlast[i])
+        bus.tvalid.value = 1
+        await RisingEdge(clock)
+        while has_tready and not bus.tready.value:
+            await RisingEdge(clock)
+    bus.tvalid.value = 0
@@ -0,0 +1,259 @@
+""" SMPTE ST 2110-20 (RFC 4175) packetizer and depacketizer"""
+
+import struct
+import numpy as np
+
+from .constants import ColorFormat
+from .utils import axis2mat
+
+# (pixels, bytes) of one pgroup
+PGROUPS = {
+    (ColorFormat.YUV422, 8): (2, 4),
+    (ColorFormat.YUV422, 10): (2, 5),
+    (ColorFormat.YUV422, 12): (2, 6),
+    (ColorFormat.YUV444, 8): (1, 3),
+    (ColorFormat.YUV444, 10): (4, 15),
+    (ColorFormat.YUV444, 12): (2, 9),
+    (ColorFormat.RGB, 8): (1, 3),
+    (ColorFormat.RGB, 10): (4, 15),
+    (ColorFormat.RGB, 12): (2, 9),
+}
+
+RTP_HEADER = 12
+PAYLOAD_HEADER = 2
+SRD_HEADER = 6
+def _pgroup(fmt, depth):
+    if (fmt, depth) not in PGROUPS:
+        raise ValueError("Unsupported ColorFormat or depth for ST 2110-20")
+    return PGROUPS[(fmt, depth)]
+
+def _to_samples(mat, resH, fmt):
+    """ matrix in axis2mat order to samples of shape (r, c*samples per pixel) in pgroup order"""
+    m = np.reshape(mat, (-1, resH, 3))
+    if fmt == ColorFormat.YUV422:
+        pairs = m[:, :resH//2*2].reshape(m.shape[0], resH//2, 2, 3)
+        samples = np.stack((pairs[:, :, 0, 1], pairs[:, :, 0, 0], pairs[:, :, 0, 2], pairs[:, :, 1, 0]), axis=-1)
+    elif fmt == ColorFormat.YUV444:
+        samples = m[:, :, [1, 0, 2]]
+    else:
+        samples = m
+    return samples.reshape(m.shape[0], -1)
+
+def _from_samples(samples, resH, fmt):
+    """ inverse of _to_samples, returns matrix of shape (r*c, 3)"""
+    r = samples.shape[0]
+    mat = np.zeros((r, resH, 3), dtype=np.int32)
+    if fmt == ColorFormat.YUV422:
+        s = samples.reshape(r, -1, 4)
+        mat[:, 0:s.shape[1]*2:2, 1] = s[:, :, 0]
+        mat[:, 0:s.shape[1]*2:2, 0] = s[:, :, 1]
+        mat[:, 0:s.shape[1]*2:2, 2] = s[:, :, 2]
+        mat[:, 1:s.shape[1]*2:2, 0] = s[:, :, 3]
+    elif fmt == ColorFormat.YUV444:
+        mat[:, :, [1, 0, 2]] = samples.reshape(r, resH, 3)
+    else:
+        mat[...] = samples.reshape(r, resH, 3)
+    return mat.reshape(r*resH, 3)
+
+def _chunk(depth):
+    """ samples and bytes of the smallest byte aligned run of depth-bit samples"""
+    bits = np.lcm(depth, 8)
+    return int(bits // depth), int(bits // 8)
+
+def _pack_bits(samples, depth):
+    """ samples of shape (r, n) to big-endian depth-bit fields, (r, n*depth/8) bytes"""
+    per, nbytes = _chunk(depth)
+    s = samples.reshape(samples.shape[0], -1, per).astype(np.uint64)
+    value = s[:, :, 0].copy()
+    for i in range(1, per):
+        value <<= np.uint64(depth)
+        value |= s[:, :, i]
+    out = np.empty(value.shape + (nbytes,), dtype=np.uint8)
+    for b in range(nbytes):
+        out[:, :, b] = value >> np.uint64(8*(nbytes-1-b))
+    return out.reshape(samples.shape[0], -1)
+
+def _unpack_bits(data, depth):
+    """ inverse of _pack_bits"""
+    per, nbytes = _chunk(depth)
+    d = data.reshape(data.shape[0], -1, nbytes)
+    value = d[:, :, 0].astype(np.uint64)
+    for b in range(1, nbytes):
+        value <<= np.uint64(8)
+        value |= d[:, :, b]
+    samples = np.empty(value.shape + (per,), dtype=np.uint16)
+    mask = np.uint64((1 << depth) - 1)
+    for i in range(per):
+        samples[:, :, i] = (value >> np.uint64(depth*(per-1-i))) & mask
+    return samples.reshape(data.shape[0], -1)
+
+def _put_be(buf, col, values, nbytes):
+    """ writes values big-endian into nbytes columns of buf starting at col"""
+    for b in range(nbytes):
+        buf[:, col+b] = (values >> (8*(nbytes-1-b))) & 0xff
+
+class ST2110Packetizer:
+    """
+    Packs frames into ST 2110-20 RTP packets, one SRD per packet, every
+    line split into the same number of packets of whole pgroups
+    - resH: Horizontal resoltuion, >1
+    - resV: Vertixal resolution, >1
+    - fmt: RGB, YUV444, YUV422
+    - depth: bits per sample, 8, 10, 12
+    - maxPacket: largest RTP packet in bytes, headers included
+    - payloadType: RTP payload type
+    - ssrc: RTP synchronisation source
+    - frameRate: frames per second, advances the 90 kHz timestamp
+    - seq, timestamp: first extended sequence number and RTP timestamp
+
+    The packets of a frame are built as one batch: headers and payloads
+    of all packets are written with whole-array operations into one
+    (packets, maxPacket) array.
+
+        st2110 = ST2110Packetizer(3840, 2160, ColorFormat.YUV422, 10)
+        for packet in st2110.packets_axis(axis, 2, 10):
+            ...
+    """
+    def __init__(self, resH, resV, fmt, depth, maxPacket=1460, payloadType=96, ssrc=0, frameRate=60,
+            seq=0, timestamp=0):
+        self.resH = resH
+        self.resV = resV
+        self.fmt = fmt
+        self.depth = depth
+        self.payloadType = payloadType
+        self.ssrc = ssrc
+        self.frameRate = frameRate
+        self.seq = seq
+        self.timestamp = timestamp
+        self.pixels, self.pgroup_bytes = _pgroup(fmt, depth)
+        headers = RTP_HEADER + PAYLOAD_HEADER + SRD_HEADER
+        self.groups_per_packet = (maxPacket - headers) // self.pgroup_bytes
+        if self.groups_per_packet < 1:
+            raise ValueError("maxPacket too small for one pgroup")
+        self.groups = resH // self.pixels
+        self.packets_per_line = -(-self.groups // self.groups_per_packet)
+
+    def frame(self, mat):
+        """
+        packetizes one frame and advances seq and timestamp
+        - mat: numpy array of shape (resV*resH, 3) in axis2mat order, samples
+          at depth bits
+        - returns: (packets, lengths), uint8 array of shape (n, maxPacket)
+          and the length of every packet
+        """
+        r, K, gpp, pg = self.resV, self.packets_per_line, self.groups_per_packet, self.pgroup_bytes
+        n = r*K
+        headers = RTP_HEADER + PAYLOAD_HEADER + SRD_HEADER
+        packets = np.zeros((n, headers + gpp*pg), dtype=np.uint8)
+
+        # payload: lines padded to K full packets, then one row per packet
+        samples = _to_samples(mat, self.resH, self.fmt)[:, :self.groups*pg*8//self.depth]
+        payload = np.zeros((r, K*gpp*pg), dtype=np.uint8)
+        payload[:, :self.groups*pg] = _pack_bits(samples, self.depth)
+        packets[:, headers:] = payload.reshape(n, gpp*pg)
+
+        k = np.tile(np.arange(K), r)
+        row = np.repeat(np.arange(r), K)
+        groups = np.minimum(gpp, self.groups - k*gpp)
+        lengths = headers + groups*pg
+        seq = (self.seq + np.arange(n, dtype=np.int64)) & 0xffffffff
+        packets[:, 0] = 0x80
+        packets[:, 1] = self.payloadType & 0x7f
+        packets[-1, 1] |= 0x80
+        _put_be(packets, 2, seq & 0xffff, 2)
+        _put_be(packets, 4, np.full(n, self.timestamp & 0xffffffff, dtype=np.int64), 4)
+        _put_be(packets, 8, np.full(n, self.ssrc & 0xffffffff, dtype=np.int64), 4)
+        _put_be(packets, 12, seq >> 16, 2)
+        _put_be(packets, 14, groups*pg, 2)
+        _put_be(packets, 16, row & 0x7fff, 2)
+        _put_be(packets, 18, (k*gpp*self.pixels) & 0x7fff, 2)
+
+        self.seq = (self.seq + n) & 0xffffffff
+        self.timestamp = (self.timestamp + round(90000 / self.frameRate)) & 0xffffffff
+        return packets, lengths
+
+    def packets(self, mat):
+        """
+        - returns: generator of the RTP packets of one frame, as bytes
+        """
+        packets, lengths = self.frame(mat)
+        for packet, length in zip(packets, lengths):
+            yield packet[:length].tobytes()
+
+    def packets_axis(self, axisFrame, pixelPerClock, pixelQuant):
+        """
+        - returns: generator of the RTP packets of one frame received as AXIS,
+          e.g. from GenAXIStream, samples shifted from pixelQuant to depth
+        """
+        mat = axis2mat(axisFrame, self.resH, pixelPerClock, pixelQuant, self.fmt).astype(np.int32)
+        if pixelQuant > self.depth:
+            mat >>= pixelQuant - self.depth
+        else:
+            mat <<= self.depth - pixelQuant
+        return self.packets(mat)
+
+class ST2110Depacketizer:
+    """
+    Reassembles ST 2110-20 RTP packets into frames
+    - resH: Horizontal resoltuion, >1
+    - resV: Vertixal resolution, >1
+    - fmt: RGB, YUV444, YUV422
+    - depth: bits per sample, 8, 10, 12
+
+    lost counts packets missing from the extended sequence numbers.
+    """
+    def __init__(self, resH, resV, fmt, depth):
+        self.resH = resH
+        self.resV = resV
+        self.fmt = fmt
+        self.depth = depth
+        self.pixels, self.pgroup_bytes = _pgroup(fmt, depth)
+        self.line_bytes = resH // self.pixels * self.pgroup_bytes
+        self.lost = 0
+        self.frames = 0
+        self._seq = None
+        self._data = np.zeros((resV, self.line_bytes), dtype=np.uint8)
+
+    def feed(self, packet):
+        """
+        - packet: one RTP packet, bytes-like
+        - returns: completed frame, numpy array of shape (resV*resH, 3) in
+          axis2mat order, when packet carries the marker bit, otherwise None
+        """
+        packet = memoryview(packet)
+        marker = packet[1] & 0x80
+        seq = (struct.unpack_from(">H", packet, RTP_HEADER)[0] << 16) | struct.unpack_from(">H", packet, 2)[0]
+        if self._seq is not None:
+            self.lost += (seq - self._seq - 1) & 0xffffffff
+        self._seq = seq
+
+        pos = RTP_HEADER + PAYLOAD_HEADER
+        srds = []
+        while True:
+            length, row, offset = struct.unpack_from(">HHH", packet, pos)
+            pos += SRD_HEADER
+            srds.append((length, row & 0x7fff, offset & 0x7fff))
+            if not offset & 0x8000:
+                break
+        for length, row, offset in srds:
+            start = offset // self.pixels * self.pgroup_bytes
+            self._data[row, start:start+length] = packet[pos:pos+length]
+            pos += length
+
+        if not marker:
+            return None
+        self.frames += 1
+        frame = _from_samples(_unpack_bits(self._data, self.depth), self.resH, self.fmt)
+        self._data = np.zeros_like(self._data)
+        return frame
+
+    def depacketize(self, packets):
+        """
+        - returns: list of the frames completed by packets
+        """
+        frames = []
+        for packet in packets:
+            frame = self.feed(packet)
+            if frame is not None:
+                frames.append(frame)
+        return frames
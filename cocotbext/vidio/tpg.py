@@ -1,10 +1,35 @@
 """ Test pattern generator"""
 
 import numpy as np
-import random as rand
 from cocotbext.axi import (AxiStreamFrame)
+from .constants import ColorFormat, Pattern, Standard
+from .csc import _tv_affine, _affine
+from .instrument import instrumented, produced
 
-def generate_frame(resh, resv, pixelperclock, pixelquant, pattern):
+# pattern parameters, sizes in pixels
+BAR_LEVEL = 0.75
+CHECKER_SIZE = 8
+BOX_SIZE = 32
+BOX_STEP = 4
+
+# R, G, B of the color bars, left to right, and of the solid fields
+_BARS = ((1, 1, 1), (1, 1, 0), (0, 1, 1), (0, 1, 0), (1, 0, 1), (1, 0, 0), (0, 0, 1), (0, 0, 0))
+_SOLID = {
+    Pattern.solid_black: (0, 0, 0),
+    Pattern.solid_white: (1, 1, 1),
+    Pattern.solid_red: (1, 0, 0),
+    Pattern.solid_green: (0, 1, 0),
+    Pattern.solid_blue: (0, 0, 1),
+}
+
+# patterns defined as full range RGB images, converted to the output format
+_RGB_PATTERNS = frozenset([Pattern.color_bars, Pattern.ramp, Pattern.zone_plate, Pattern.checkerboard,
+    Pattern.moving_box, *_SOLID])
+
+# patterns that are the same in every frame
+STATIC_PATTERNS = frozenset([Pattern.p_incr, Pattern.h_incr]) | (_RGB_PATTERNS - {Pattern.moving_box})
+
+def generate_frame(resh, resv, pixelperclock, pixelquant, pattern, compact=False, seed=0, frameIndex=0):
     """ 
     - returns: AXIS transaction for one frame
     - resh: Horizontal resoltuion, >1
@@ -15,6 +40,10 @@ def generate_frame(resh, resv, pixelperclock, pixelquant, pattern):
         - p_incr = counter increment on every pixel
         - rand = random
         - h_incr = horizontal pixel increment
+    - compact: tuser as 0, or [1]*8 + [0] on the first line, instead of
+      one int per byte
+    - seed, frameIndex: key and frame number of the rand pattern, the
+      frame of Pattern.seeded
     """
     m ,n, p, q = resh, resv, pixelperclock, pixelquant
 
@@ -28,10 +57,7 @@ def generate_frame(resh, resv, pixelperclock, pixelquant, pattern):
                     for k in range(3):
                         frame[i, j, k] = (i * n * 3 + j * 3 + k) % (2**q)
         case "rand":
-            for i in range(m):
-                for j in range(n):
-                    for k in range(3):
-                        frame[i, j, k] = rand.randrange(1024)
+            frame[...] = seeded_lines(m, q, seed, frameIndex, range(n)).reshape(frame.shape)
         case "h_incr":
             for i in range(n):
                 for j in range(m):
@@ -51,9 +77,136 @@ def generate_frame(resh, resv, pixelperclock, pixelquant, pattern):
         for byte_array in packed_list:
             bytearray_.extend(byte_array)
 
-        single_axi_frame = AxiStreamFrame(
-                tdata=bytearray_,
-                tuser=[1]*8 + [0] * (len(bytearray_)-8) if j == 0 else [0]*len(bytearray_)
-            )
+        if compact:
+            tuser = [1]*8 + [0] if j == 0 else 0
+        else:
+            tuser = [1]*8 + [0] * (len(bytearray_)-8) if j == 0 else [0]*len(bytearray_)
+        single_axi_frame = AxiStreamFrame(tdata=bytearray_, tuser=tuser)
         full_axi_frame.append(single_axi_frame)
-    return full_axi_frame
\ No newline at end of file
+    return full_axi_frame
+
+def seeded_lines(resH, pixelQuant, seed, frameIndex, lines):
+    """
+    - returns: numpy array of shape (len(lines), resH, 3), dtype uint64, of
+      the Pattern.seeded samples of lines of frame frameIndex
+    - lines: iterable of line numbers
+
+    Line k of frame f is the top pixelQuant bits of consecutive outputs of
+    a Philox generator keyed by seed with its counter starting at (0, k, f, 0),
+    so it does not depend on any other line or on np.random.
+    """
+    lines = list(lines)
+    rgb = np.empty((len(lines), resH, 3), dtype=np.uint64)
+    for i, k in enumerate(lines):
+        gen = np.random.Philox(key=seed, counter=[0, k, frameIndex, 0])
+        rgb[i] = gen.random_raw(resH*3).reshape(resH, 3)
+    rgb >>= np.uint64(64 - pixelQuant)
+    return rgb
+
+def _indexed_pattern(resH, resV, pixelQuant, pattern, rows, frameIndex):
+    """
+    - returns: (palette, index), the full range R, G, B code values of the
+      colors of pattern as an array of shape (colors, 3), and the color of
+      every pixel on rows as an array of shape (len(rows), resH)
+    """
+    maxval = (1 << pixelQuant) - 1
+    cols = np.arange(resH)
+    y = rows[:, None]
+    if pattern == Pattern.color_bars:
+        palette = np.array(_BARS) * round(BAR_LEVEL * maxval)
+        return palette, np.broadcast_to(cols * len(_BARS) // resH, (len(rows), resH))
+    elif pattern in _SOLID:
+        palette = np.array([_SOLID[pattern]]) * maxval
+        return palette, np.zeros((len(rows), resH), dtype=np.intp)
+
+    # grey patterns index a palette of every grey level
+    palette = np.arange(maxval + 1)[:, None].repeat(3, axis=1)
+    if pattern == Pattern.ramp:
+        grey = np.broadcast_to(cols * maxval // max(resH - 1, 1), (len(rows), resH))
+    elif pattern == Pattern.zone_plate:
+        # the phase derivative reaches pi per pixel at the edge of the frame
+        r2 = (cols[None, :] - resH / 2)**2 + (y - resV / 2)**2
+        grey = np.rint(maxval * (0.5 + 0.5 * np.cos(np.pi * r2 / max(resH, resV)))).astype(np.intp)
+    elif pattern == Pattern.checkerboard:
+        grey = (((cols[None, :] // CHECKER_SIZE) + (y // CHECKER_SIZE)) & 1) * maxval
+    elif pattern == Pattern.moving_box:
+        size = min(BOX_SIZE, resH, resV)
+        x0 = frameIndex * BOX_STEP % (resH - size + 1)
+        y0 = frameIndex * BOX_STEP % (resV - size + 1)
+        inside = (cols[None, :] >= x0) & (cols[None, :] < x0 + size) & (y >= y0) & (y < y0 + size)
+        grey = inside * maxval
+    return palette, grey
+
+def _in_format(palette, pixelQuant, format, standard):
+    """
+    full range R, G, B colors of shape (colors, 3) to uint64 components in
+    the order of format: bus order G, B, R, or TV range Y, U, V of standard
+    """
+    if format == ColorFormat.RGB:
+        return palette[:, [1, 2, 0]].astype(np.uint64)
+    matrix, shift = _tv_affine(standard, pixelQuant, False)
+    yuv = _affine(palette.T.astype(np.float64), matrix, shift, (1 << pixelQuant) - 1)
+    return np.stack(yuv, axis=-1).astype(np.uint64)
+
+@instrumented("pattern", produced)
+def pattern_frame(resH, resV, pixelQuant, pattern, lines=None, seed=0, frameIndex=0, format=ColorFormat.RGB,
+        standard=Standard.BT2020, rng=None):
+    """
+    - returns: numpy array of shape (len(lines), resH, 3), dtype uint64
+    - resH: Horizontal resoltuion, >1
+    - resV: Vertixal resolution, >1
+    - pixelQuant: Quantization, 10
+    - pattern: any Pattern
+    - lines: slice of the lines to build, default all resV lines
+    - seed, frameIndex: key and frame number of Pattern.seeded, frame number
+      of Pattern.moving_box
+    - format, standard: output format of the patterns defined as RGB images
+      (color_bars, ramp, zone_plate, checkerboard, solid_*, moving_box);
+      for YUV formats these are converted to TV range YUV of standard
+    - rng: np.random.RandomState drawing Pattern.rand, default np.random
+
+    Every pattern is computed for all of its lines at once with whole-array
+    operations; the RGB image patterns convert only their colors to format
+    and index them per pixel.
+    """
+    c, q = resH, pixelQuant
+    lines = slice(None) if lines is None else lines
+    r = len(range(resV)[lines])
+    if pattern in _RGB_PATTERNS:
+        palette, index = _indexed_pattern(c, resV, q, pattern, np.arange(resV)[lines], frameIndex)
+        return _in_format(palette, q, format, standard)[index]
+    elif pattern == Pattern.p_incr:
+        rows = np.arange(resV, dtype=np.uint64)[lines, None, None] * np.uint64(resV * 3)
+        cols = np.arange(c, dtype=np.uint64)[None, :, None] * np.uint64(3)
+        comp = np.arange(3, dtype=np.uint64)[None, None, :]
+        rgb = rows + cols + comp
+        rgb &= np.uint64((2**q) - 1)
+    elif pattern == Pattern.rand:
+        rgb = (np.random if rng is None else rng).rand(r, c, 3)
+        rgb = (rgb*((2**q)-1)).astype(np.uint64)
+    elif pattern == Pattern.h_incr:
+        cols = np.arange(c, dtype=np.uint64) & np.uint64((2**q) - 1)
+        rgb = np.broadcast_to(cols[None, :, None], (r, c, 3)).copy()
+    elif pattern == Pattern.seeded:
+        rgb = seeded_lines(c, q, seed, frameIndex, range(resV)[lines])
+    else:
+        raise ValueError("Unknown pattern")
+    return rgb
+
+def chroma_mask(resH, resV, format, lines=None):
+    """
+    - returns: boolean array of shape (len(lines)*resH,), True where chroma is dropped
+    - resH: Horizontal resoltuion, >1
+    - resV: Vertixal resolution, >1
+    - format: RGB, YUV444, YUV422, YUV420
+    - lines: slice of the lines to build, default all resV lines
+    """
+    lines = slice(None) if lines is None else lines
+    rows = np.arange(resV)[lines, None]
+    cols = np.arange(resH)[None, :]
+    odd_pixel = ((rows * resH + cols) & 1).astype(bool)
+    if format == ColorFormat.YUV422:
+        return odd_pixel.ravel()
+    elif format == ColorFormat.YUV420:
+        return (odd_pixel | (rows & 1).astype(bool)).ravel()
+    return np.zeros(rows.size * resH, dtype=bool)
@@ -1,139 +1,419 @@
 """Utilities"""
+import functools
 import numpy as np
 from cocotbext.axi import AxiStreamFrame
 from .constants import ColorFormat
+from .frame import VideoFrame
+from .instrument import instrumented, packed, repacked, unpacked
 
-def mat2axis(matrix, resH, pixelPerClock, pixelQuant, outFormat):
-    """ 
-    converts matrix to axis
-    - matrix: numpy array of shape mx3, where m = rows*columns 3 = color channels
-    - return: cocotbext.axi.AxiStreamFrame
+def _component_order(fmt, p, chroma=True):
     """
-    c = resH
-    p = pixelPerClock
-    v = int(matrix.shape[0]/resH)
-    q = pixelQuant
-    pack_range =  int(c/p)
-    frame = matrix
+    order in which (pixel, channel) components are laid out on the bus for
+    p pixels, LSB first. Dropped chroma is given as channel None.
+    """
+    if fmt == ColorFormat.RGB or fmt == ColorFormat.YUV444:
+        return [(n, ch) for n in range(p) for ch in range(3)]
+    elif fmt == ColorFormat.YUV422 or fmt == ColorFormat.YUV420:
+        order = []
+        for n in range(0, p, 2):
+            order += [(n, 0), (n, 1 if chroma else None), (n+1, 0), (n, 2 if chroma else None)]
+        return order
+    raise ValueError("Unsupported ColorFormat")
+
+class PackingLayout:
+    """
+    Bus layout compiled from a (format, pixelPerClock, pixelQuant, padBits)
+    descriptor, see packing_layout
+    - unit: pixels in the smallest group of beats repeating along a line,
+      two for 4:2:2 and 4:2:0 at one pixel per clock
+    - beats: beats per unit
+    - beat_bytes: bytes per beat, the components of a beat padded to a
+      multiple of padBits
+    - unit_bytes, nwords: bytes and uint64 words holding one unit
+    - fields: (n, ch, word, shift, spill) for every component, placing
+      channel ch of pixel n at bit shift of word, spill when its top bits
+      continue at bit 0 of the next word
+    - luma_fields: same for the lines of YUV420 that carry no chroma
+    """
+    __slots__ = ("format", "pixelPerClock", "pixelQuant", "padBits", "unit", "beats",
+        "beat_bytes", "unit_bytes", "nwords", "fields", "luma_fields")
+
+    def __init__(self, fmt, pixelPerClock, pixelQuant, padBits=64):
+        p, q = pixelPerClock, pixelQuant
+        self.format = fmt
+        self.pixelPerClock = p
+        self.pixelQuant = q
+        self.padBits = padBits
+        subsampled = fmt in (ColorFormat.YUV422, ColorFormat.YUV420)
+        self.unit = max(p, 2) if subsampled else p
+        self.beats = self.unit // p
+        order = _component_order(fmt, self.unit)
+        per_beat = len(order) // self.beats
+        beat_bits = -(-per_beat*q // padBits) * padBits
+        self.beat_bytes = beat_bits // 8
+        self.unit_bytes = self.beats*self.beat_bytes
+        self.nwords = -(-self.unit_bytes // 8)
+        self.fields = self._compile(order, per_beat, beat_bits)
+        self.luma_fields = self._compile(_component_order(fmt, self.unit, chroma=False), per_beat, beat_bits)
+
+    def _compile(self, order, per_beat, beat_bits):
+        fields = []
+        for i, (n, ch) in enumerate(order):
+            if ch is None:
+                continue
+            w, shift = divmod((i // per_beat)*beat_bits + (i % per_beat)*self.pixelQuant, 64)
+            fields.append((n, ch, w, shift, shift + self.pixelQuant > 64))
+        return tuple(fields)
+
+    def line_bytes(self, resH):
+        return (resH // self.unit) * self.unit_bytes
+
+    def to_bytes(self, words):
+        """ packed words of shape (lines, units, nwords) to tdata bytes"""
+        if self.unit_bytes == 8*self.nwords:
+            return words.tobytes()
+        return words.view(np.uint8)[..., :self.unit_bytes].tobytes()
+
+    def from_bytes(self, data, units):
+        """ tdata bytes of whole lines of units units to words of shape (lines, units, nwords)"""
+        raw = np.frombuffer(data, dtype=np.uint8)
+        r = raw.size // (units*self.unit_bytes)
+        raw = raw[:r*units*self.unit_bytes]
+        if self.unit_bytes == 8*self.nwords:
+            return raw.view('<u8').reshape(r, units, self.nwords)
+        words = np.zeros((r, units, self.nwords), dtype='<u8')
+        words.view(np.uint8)[..., :self.unit_bytes] = raw.reshape(r, units, self.unit_bytes)
+        return words
+
+@functools.lru_cache(maxsize=None)
+def packing_layout(fmt, pixelPerClock, pixelQuant, padBits=64):
+    """
+    - returns: PackingLayout, compiled once per descriptor
+    - fmt: RGB, YUV444, YUV422, YUV420
+    - pixelPerClock: 1, 2, 4, 8
+    - pixelQuant: bits per component, 1 to 16
+    - padBits: each beat is padded to a multiple of padBits, 64 keeps
+      8 bytes per 2 pixels at 10 bits, 8 gives byte aligned beats
+    """
+    if pixelPerClock not in (1, 2, 4, 8):
+        raise ValueError("Unsupported pixelPerClock")
+    if not 1 <= pixelQuant <= 16:
+        raise ValueError("Unsupported pixelQuant")
+    if padBits <= 0 or padBits % 8:
+        raise ValueError("padBits must be a positive multiple of 8")
+    if fmt not in (ColorFormat.RGB, ColorFormat.YUV444, ColorFormat.YUV422, ColorFormat.YUV420):
+        raise ValueError("Unsupported ColorFormat")
+    return PackingLayout(fmt, pixelPerClock, pixelQuant, padBits)
+
+def _pack_words(component, fields, nwords, lines):
+    """
+    packs the components of lines into uint64 words of shape
+    (lines, units, nwords) as placed by fields. component(n, ch, lines)
+    returns channel ch of pixel n of every unit, shape (lines, units).
+    """
+    words = None
+    for n, ch, w, shift, spill in fields:
+        comp = component(n, ch, lines).astype(np.uint64)
+        if words is None:
+            words = np.zeros(comp.shape + (nwords,), dtype=np.uint64)
+        words[:, :, w] |= comp << np.uint64(shift)
+        if spill:
+            words[:, :, w+1] |= comp >> np.uint64(64 - shift)
+    return words
+
+# indices of R, G, B in bus order (G, B, R), and of G, B, R in R, G, B
+_FROM_BUS = [2, 0, 1]
+_TO_BUS = [1, 2, 0]
+
+def _check_order(order):
+    """ order of RGB matrices, "rgb" for R, G, B or "bus" for G, B, R"""
+    if order not in ("rgb", "bus"):
+        raise ValueError("Unknown channel order %r, expected 'rgb' or 'bus'" % (order,))
+    return order
+
+def _axis_line(tdata, tuser):
+    """ AxiStreamFrame that takes ownership of tdata instead of copying it"""
+    single_axi_frame = AxiStreamFrame(tuser=tuser)
+    single_axi_frame.tdata = tdata
+    return single_axi_frame
+
+def _frame_lines(v, firstLine, resV):
+    """
+    frame line number of each of v lines starting at firstLine, restarting
+    every resV lines when several frames are stacked
+    """
+    k = firstLine + np.arange(v)
+    return k if resV is None else k % resV
+
+def _line_parity(v, firstLine, resV):
+    """ selectors of the even (chroma carrying) and odd lines"""
+    if resV is None or resV % 2 == 0:
+        return slice(firstLine % 2, None, 2), slice(1 - firstLine % 2, None, 2)
+    even = _frame_lines(v, firstLine, resV) % 2 == 0
+    return np.flatnonzero(even), np.flatnonzero(~even)
+
+def _pack_frame(matrix, resH, pixelPerClock, pixelQuant, outFormat, firstLine=0, resV=None, padBits=64):
+    """ packs matrix or VideoFrame into uint64 words of shape (lines, units, nwords)"""
+    layout = packing_layout(outFormat, pixelPerClock, pixelQuant, padBits)
+    u = layout.unit
+    units = resH // u
+    if isinstance(matrix, VideoFrame):
+        v = matrix.resV
+        component = lambda n, ch, lines: matrix.component(n, ch, lines, u, units)
+    else:
+        v = int(matrix.shape[0]/resH)
+        pixels = np.asarray(matrix)[:v*resH].reshape(v, resH, 3)[:, :units*u].reshape(v, units, u, 3)
+        component = lambda n, ch, lines: pixels[lines, :, n, ch]
+
+    words = np.empty((v, units, layout.nwords), dtype='<u8')
+    if outFormat == ColorFormat.YUV420:
+        even, odd = _line_parity(v, firstLine, resV)
+        words[even] = _pack_words(component, layout.fields, layout.nwords, even)
+        words[odd] = _pack_words(component, layout.luma_fields, layout.nwords, odd)
+    else:
+        words[:] = _pack_words(component, layout.fields, layout.nwords, slice(None))
+    return words
+
+def _sideband(start, beat_bytes, line_bytes, compact):
+    """
+    tuser of one line, set on the first beat of a frame. compact gives
+    0 for the other lines and stops the start of frame list after its
+    first 0, AxiStreamFrame repeats the last value up to the line length.
+    """
+    if compact:
+        return [1]*beat_bytes + [0] if start else 0
+    return [1]*beat_bytes + [0] * (line_bytes-beat_bytes) if start else [0]*line_bytes
+
+def _words_to_axis(words, layout, firstLine=0, resV=None, compact=False):
+    """ one AxiStreamFrame per line of packed words of shape (lines, units, nwords)"""
+    v, units = words.shape[:2]
+    # the words viewed as bytes, each line copied once straight into its tdata
+    raw = np.ascontiguousarray(words).view(np.uint8).reshape(v, units, 8*layout.nwords)
+    beat_bytes = layout.beat_bytes
+    line_bytes = units*layout.unit_bytes
+    start = _frame_lines(v, firstLine, resV) == 0
     full_axi_frame = []
-    k = 0
     for j in range(v):
-        packed_list = []
-        for _ in range(pack_range):
-            if outFormat == ColorFormat.RGB or outFormat == ColorFormat.YUV444:
-                if p==2 :
-                    packed_value = (frame[k+1, 2] << q*5) | (frame[k+1, 1] << q*4) | (frame[k+1, 0] << q*3) | (frame[k, 2] << q*2) | (frame[k, 1] << q) | frame[k, 0]
-                    packed_list.append(packed_value.tobytes())
-                elif p==4 :
-                    packed_value = (frame[k+2, 0] << q*6) |  (frame[k+1, 2] << q*5) | (frame[k+1, 1] << q*4) | (frame[k+1, 0] << q*3) | (frame[k, 2] << q*2) | (frame[k, 1] << q) | frame[k, 0]
-                    packed_list.append(packed_value.tobytes())
-                    packed_value = (frame[k+3, 2] << q*5-4) | (frame[k+3, 1] << q*4-4) | (frame[k+3, 0] << q*3-4) | (frame[k+2, 2] << q*2-4) | (frame[k+2, 1] << q-4) | (frame[k+2, 0]  >> 4)
-                    packed_list.append(packed_value.tobytes())
-            elif outFormat == ColorFormat.YUV422: 
-                if p==2 :
-                    packed_value = (frame[k, 2] << q*3) | (frame[k+1, 0] << q*2) | (frame[k, 1] << q) | frame[k, 0]
-                    packed_list.append(packed_value.tobytes())
-                elif p==4 :
-                    packed_value = (frame[k+3, 0] << q*6) | (frame[k+2, 1] << q*5) | (frame[k+2, 0] << q*4) | (frame[k, 2] << q*3) | (frame[k+1, 0] << q*2) | (frame[k, 1] << q) | frame[k, 0]
-                    packed_list.append(packed_value.tobytes())
-                    packed_value = (frame[k+2, 2] << q-4) | (frame[k+3, 0] >> 4)
-                    packed_list.append(packed_value.tobytes())
-            elif outFormat == ColorFormat.YUV420:
-                if (j%2) :
-                    if p==2 :
-                        packed_value = (0 << q*3) | (frame[k+1, 0] << q*2) | (0 << q) | frame[k, 0]
-                        packed_list.append(packed_value.tobytes())
-                    elif p==4 :
-                        packed_value = (frame[k+3, 0] << q*6) | (0 << q*5) | (frame[k+2, 0] << q*4) | (0 << q*3) | (frame[k+1, 0] << q*2) | (0 << q) | frame[k, 0]
-                        packed_list.append(packed_value.tobytes())
-                        packed_value = (0 << q-4) | (frame[k+3, 0] >> 4)
-                        packed_list.append(packed_value.tobytes())
-                else :
-                    if p==2 :
-                        packed_value = (frame[k, 2] << q*3) | (frame[k+1, 0] << q*2) | (frame[k, 1] << q) | frame[k, 0]
-                        packed_list.append(packed_value.tobytes())
-                    elif p==4 : # 64-bit intergers so ned to seperate this
-                        packed_value = (frame[k+3, 0] << q*6) | (frame[k+2, 1] << q*5) | (frame[k+2, 0] << q*4) | (frame[k, 2] << q*3) | (frame[k+1, 0] << q*2) | (frame[k, 1] << q) | frame[k, 0]
-                        packed_list.append(packed_value.tobytes())
-                        packed_value = (frame[k+2, 2] << q-4) | (frame[k+3, 0] >> 4)
-                        packed_list.append(packed_value.tobytes())
-            k = k + p
-        bytearray_ = bytearray()
-        for byte_array in packed_list:
-            bytearray_.extend(byte_array)
-        tuser = []
-        if p == 2: 
-            tuser=[1]*8 + [0] * (len(bytearray_)-8) if j == 0 else [0]*len(bytearray_)
-        elif p == 4:
-            tuser=[1]*16 + [0] * (len(bytearray_)-16) if j == 0 else [0]*len(bytearray_)
-        single_axi_frame = AxiStreamFrame(
-                tdata=bytearray_,
-                tuser = tuser
-            )
-        full_axi_frame.append(single_axi_frame)
+        if layout.unit_bytes == 8*layout.nwords:
+            tdata = bytearray(raw[j])
+        else:
+            tdata = bytearray(line_bytes)
+            np.frombuffer(tdata, dtype=np.uint8).reshape(units, layout.unit_bytes)[...] = raw[j, :, :layout.unit_bytes]
+        full_axi_frame.append(_axis_line(tdata, _sideband(start[j], beat_bytes, line_bytes, compact)))
     return full_axi_frame
 
-def axis2mat(axisFrame, resH, pixelPerClock, pixelQuant, fmt):
+@instrumented("pack", packed)
+def mat2axis(matrix, resH, pixelPerClock, pixelQuant, outFormat, firstLine=0, resV=None, padBits=64,
+        compact=False):
+    """ 
+    converts matrix to axis
+    - matrix: numpy array of shape mx3, where m = rows*columns 3 = color channels,
+      or a VideoFrame
+    - pixelPerClock: 1, 2, 4, 8
+    - pixelQuant: bits per component, 8, 10, 12, 16
+    - firstLine: frame line number of the first row in matrix, used for
+      start of frame (tuser) and YUV420 line parity when packing part of a frame
+    - resV: lines per frame when matrix holds several frames back to back,
+      start of frame and line parity restart every resV lines
+    - padBits: beat padding, see packing_layout
+    - compact: tuser as 0 on lines without start of frame and a list of
+      one beat plus a 0 on the first line, instead of one int per byte
+    - return: cocotbext.axi.AxiStreamFrame
+    """
+    words = _pack_frame(matrix, resH, pixelPerClock, pixelQuant, outFormat, firstLine, resV, padBits)
+    layout = packing_layout(outFormat, pixelPerClock, pixelQuant, padBits)
+    return _words_to_axis(words, layout, firstLine, resV, compact)
+
+class BeatArray:
+    """
+    Packed frame as one contiguous array of bus beats, for driving the bus
+    directly instead of through AxiStreamFrame objects
+    - tdata: numpy array of shape (num_beats, beat_bytes), dtype uint8
+    - tuser: start of frame per beat, bit-packed LSB first (np.packbits)
+    - tlast: end of line per beat, bit-packed LSB first
+    - lines: number of lines, each of num_beats // lines beats
+    - resH: pixels per line, None when unknown
+    """
+    __slots__ = ("tdata", "tuser", "tlast", "lines", "resH")
+
+    def __init__(self, tdata, tuser, tlast, lines, resH=None):
+        self.tdata = tdata
+        self.tuser = tuser
+        self.tlast = tlast
+        self.lines = lines
+        self.resH = resH
+
+    @property
+    def num_beats(self):
+        return self.tdata.shape[0]
+
+    @property
+    def beat_bytes(self):
+        return self.tdata.shape[1]
+
+    def __len__(self):
+        return self.num_beats
+
+    def __repr__(self):
+        return "BeatArray(beats=%d, beat_bytes=%d, lines=%d)" % (self.num_beats, self.beat_bytes, self.lines)
+
+    def sideband(self):
+        """
+        - returns: (tuser, tlast) unpacked to boolean arrays of shape (num_beats,)
+        """
+        n = self.num_beats
+        return (np.unpackbits(self.tuser, count=n, bitorder='little').astype(bool),
+            np.unpackbits(self.tlast, count=n, bitorder='little').astype(bool))
+
+    def line(self, j):
+        """
+        - returns: tdata of line j as bytes
+        """
+        per_line = self.num_beats // self.lines
+        return self.tdata[j*per_line:(j+1)*per_line].tobytes()
+
+@instrumented("pack", packed)
+def mat2beats(matrix, resH, pixelPerClock, pixelQuant, outFormat, firstLine=0, resV=None, padBits=64):
+    """
+    converts matrix to one contiguous beat array, arguments as mat2axis
+    - return: BeatArray
+    """
+    words = _pack_frame(matrix, resH, pixelPerClock, pixelQuant, outFormat, firstLine, resV, padBits)
+    layout = packing_layout(outFormat, pixelPerClock, pixelQuant, padBits)
+    v, units = words.shape[:2]
+    per_line = units*layout.beats
+    tdata = np.frombuffer(layout.to_bytes(words), dtype=np.uint8).reshape(v*per_line, layout.beat_bytes)
+    tuser = np.zeros((v, per_line), dtype=bool)
+    tuser[:, 0] = _frame_lines(v, firstLine, resV) == 0
+    tlast = np.zeros((v, per_line), dtype=bool)
+    tlast[:, -1] = True
+    return BeatArray(tdata, np.packbits(tuser, bitorder='little'), np.packbits(tlast, bitorder='little'), v, resH)
+
+@instrumented("pack", repacked)
+def beats2axis(beats, compact=False):
+    """
+    converts a BeatArray to axis, one AxiStreamFrame per line
+    - compact: compact tuser, see mat2axis
+    - return: list of cocotbext.axi.AxiStreamFrame
+    """
+    tuser, _ = beats.sideband()
+    per_line = beats.num_beats // beats.lines
+    beat_bytes = beats.beat_bytes
+    line_bytes = per_line*beat_bytes
+    rows = np.ascontiguousarray(beats.tdata).reshape(beats.lines, line_bytes)
+    return [_axis_line(bytearray(rows[j]), _sideband(tuser[j*per_line], beat_bytes, line_bytes, compact))
+        for j in range(beats.lines)]
+
+def _unpack_words(words, fields, q, store, lines):
+    """
+    inverse of _pack_words: extracts the q-bit components placed by fields
+    from uint64 words of shape (lines, units, nwords) and hands each to
+    store(n, ch, lines, values), values of shape (lines, units)
+    """
+    mask = np.uint64((1 << q) - 1)
+    for n, ch, w, shift, spill in fields:
+        comp = words[lines, :, w] >> np.uint64(shift)
+        if spill:
+            comp |= words[lines, :, w+1] << np.uint64(64 - shift)
+        comp &= mask
+        store(n, ch, lines, comp)
+
+@instrumented("unpack", unpacked)
+def axis2mat(axisFrame, resH, pixelPerClock, pixelQuant, fmt, firstLine=0, out=None, resV=None, padBits=64):
     """ 
     converts axis to matrix
-    - axisFrame: cocotbext.axi.AxiStreamFrame
-    - return: numpy array of shape (r*c, 3)
+    - axisFrame: list of cocotbext.axi.AxiStreamFrame, one per line, a
+      BeatArray, or a bytes-like object holding the tdata of all lines back
+      to back
+    - pixelPerClock: 1, 2, 4, 8
+    - pixelQuant: bits per component, 8, 10, 12, 16
+    - firstLine: frame line number of the first line, used for YUV420 line
+      parity when unpacking part of a frame
+    - resV: lines per frame when axisFrame holds several frames back to
+      back, YUV420 line parity restarts every resV lines
+    - out: optional array of shape (r, c, 3) to decode into, or a VideoFrame
+      of the same format; planes keep the bus channel order
+    - padBits: beat padding, see packing_layout
+    - return: numpy array of shape (r*c, 3), int16 (int32 at 16 bits), or
+      out when it is a VideoFrame
     """
-    r = len(axisFrame)
     c = resH
-    p = pixelPerClock
-    pack_range = int(c/p)
     q = pixelQuant
-    mat = np.zeros((r, c, 3), dtype=np.int16)
-    mask = (1 << q) - 1
-    if (fmt == ColorFormat.RGB):
-        for i in range(r):
-            for j in range(pack_range):
-                d_val = int.from_bytes(axisFrame[i].tdata[j*8:8*(j+1)], byteorder='little', signed=False)
-                mat[i][2*j][0] = d_val >> 2*10 & mask 
-                mat[i][2*j][1] = d_val >> 0*10 & mask
-                mat[i][2*j][2] = d_val >> 1*10 & mask 
-                mat[i][2*j+1][0] = d_val >> 5*10 & mask 
-                mat[i][2*j+1][1] = d_val >> 3*10 & mask 
-                mat[i][2*j+1][2] = d_val >> 4*10 & mask
-    elif (fmt == ColorFormat.YUV444):
-        for i in range(r):
-            for j in range(pack_range):
-                d_val = int.from_bytes(axisFrame[i].tdata[j*8:8*(j+1)], byteorder='little', signed=False)
-                mat[i][2*j][0] = d_val >> 0*10 & mask
-                mat[i][2*j][1] = d_val >> 1*10 & mask
-                mat[i][2*j][2] = d_val >> 2*10 & mask
-                mat[i][2*j+1][0] = d_val >> 3*10 & mask
-                mat[i][2*j+1][1] = d_val >> 4*10 & mask
-                mat[i][2*j+1][2] = d_val >> 5*10 & mask
-    elif (fmt == ColorFormat.YUV422):
-        for i in range(r):
-            for j in range(pack_range):
-                d_val = int.from_bytes(axisFrame[i].tdata[j*8:8*(j+1)], byteorder='little', signed=False)
-                mat[i][2*j][0] = d_val >> 0*10 & mask
-                mat[i][2*j][1] = d_val >> 1*10 & mask
-                mat[i][2*j+1][0] = d_val >> 2*10 & mask
-                mat[i][2*j][2] = d_val >> 3*10 & mask
-    elif (fmt == ColorFormat.YUV420):
-        for i in range(r):
-            if i%2:
-                for j in range(pack_range):
-                    d_val = int.from_bytes(axisFrame[i].tdata[j*8:8*(j+1)], byteorder='little', signed=False)
-                    mat[i][2*j][0] = d_val >> 0*10 & mask
-                    mat[i][2*j][1] = 0
-                    mat[i][2*j+1][0] = d_val >> 2*10 & mask
-                    mat[i][2*j][2] = 0
-            else :
-                for j in range(pack_range):
-                    d_val = int.from_bytes(axisFrame[i].tdata[j*8:8*(j+1)], byteorder='little', signed=False)
-                    mat[i][2*j][0] = d_val >> 0*10 & mask
-                    mat[i][2*j][1] = d_val >> 1*10 & mask
-                    mat[i][2*j+1][0] = d_val >> 2*10 & mask
-                    mat[i][2*j][2] = d_val >> 3*10 & mask
+    layout = packing_layout(fmt, pixelPerClock, q, padBits)
+    u = layout.unit
+    units = c // u
+    line_bytes = layout.line_bytes(c)
+    if isinstance(axisFrame, (list, tuple)):
+        if any(len(line.tdata) != line_bytes for line in axisFrame):
+            raise ValueError("Unexpected line length, expected %d bytes" % line_bytes)
+        data = b''.join(line.tdata for line in axisFrame)
+    elif isinstance(axisFrame, BeatArray):
+        if axisFrame.num_beats*axisFrame.beat_bytes != axisFrame.lines*line_bytes:
+            raise ValueError("Unexpected line length, expected %d bytes" % line_bytes)
+        data = axisFrame.tdata
     else:
-        raise ValueError("Unsupported ColorFormat")
-    
-    return np.reshape(mat, newshape=(r*c, 3))
+        data = axisFrame
+        if memoryview(data).nbytes % line_bytes:
+            raise ValueError("Unexpected buffer length, expected a multiple of %d bytes" % line_bytes)
+    # view the received tdata as one typed buffer, no per-word copies
+    words = layout.from_bytes(data, units)
+    r = words.shape[0]
+
+    if isinstance(out, VideoFrame):
+        frame = out
+        for plane in frame.planes:
+            plane[...] = 0
+        def store(n, ch, lines, values):
+            frame.set_component(n, ch, lines, u, units, values)
+    else:
+        if out is None:
+            mat = np.zeros((r, c, 3), dtype=np.int16 if q < 16 else np.int32)
+        else:
+            mat = out
+            mat[...] = 0
+        def store(n, ch, lines, values):
+            mat[lines, n:units*u:u, ch] = values
+
+    if fmt == ColorFormat.RGB:
+        # bus carries G, B, R; the matrix is returned as R, G, B
+        fields = layout.fields
+        if not isinstance(out, VideoFrame):
+            fields = [(n, (ch+1) % 3, w, shift, spill) for n, ch, w, shift, spill in fields]
+        _unpack_words(words, fields, q, store, slice(None))
+    elif fmt == ColorFormat.YUV444 or fmt == ColorFormat.YUV422:
+        _unpack_words(words, layout.fields, q, store, slice(None))
+    else:
+        even, odd = _line_parity(r, firstLine, resV)
+        _unpack_words(words, layout.fields, q, store, even)
+        _unpack_words(words, layout.luma_fields, q, store, odd)
+
+    if isinstance(out, VideoFrame):
+        return out
+    return np.reshape(mat, (r*c, 3))
+
+def mat2axis_batch(frames, resH, pixelPerClock, pixelQuant, outFormat, compact=False):
+    """
+    converts a stack of frames to axis in one pass
+    - frames: numpy array of shape (N, r, c, 3)
+    - compact: compact tuser, see mat2axis
+    - return: list of N frames, each a list of cocotbext.axi.AxiStreamFrame
+    """
+    n, r = frames.shape[:2]
+    lines = mat2axis(np.reshape(frames, (-1, 3)), resH, pixelPerClock, pixelQuant, outFormat, resV=r, compact=compact)
+    return [lines[f*r:(f+1)*r] for f in range(n)]
+
+def axis2mat_batch(frames, resH, pixelPerClock, pixelQuant, fmt):
+    """
+    converts a list of frames received as axis in one pass
+    - frames: list of N frames, each a list of cocotbext.axi.AxiStreamFrame
+    - return: numpy array of shape (N, r, c, 3)
+    """
+    r = len(frames[0]) if frames else 0
+    if any(len(frame) != r for frame in frames):
+        raise ValueError("Frames of a batch must have the same number of lines")
+    lines = [line for frame in frames for line in frame]
+    mat = axis2mat(lines, resH, pixelPerClock, pixelQuant, fmt, resV=r)
+    return np.reshape(mat, (len(frames), r, resH, 3))
 
 def rgbtoy444(matrix):
     pass
@@ -1,91 +1,231 @@
+import copy
 import numpy as np
 
-from .utils import mat2axis, axis2mat
+from .utils import mat2axis, axis2mat, mat2axis_batch, axis2mat_batch, _axis_line, mat2beats, beats2axis, BeatArray
 from .constants import Standard, Pattern, ColorFormat
-from .csc import rgb2yuv, y444to422, y420to422
+from .csc import convert_frame
+from .tpg import pattern_frame, chroma_mask, STATIC_PATTERNS
+from .signature import frame_signature
+from .frame import VideoFrame
+from .instrument import instrumented, produced, generated
 
-def GenAXIStream(resH, resV, pixelPerClock, pixelQuant, pattern, format):
+@instrumented("generate", generated)
+def GenAXIStream(resH, resV, pixelPerClock, pixelQuant, pattern, format, signature=False, frame=False,
+        seed=0, frameIndex=0, compact=False, beats=False, cache=None, standard=Standard.BT2020):
     """
-    - returns: AXIS transaction for one frame
+    - returns: AXIS transaction for one frame, and its reference matrix
     - resh: Horizontal resoltuion, >1
     - resv: Vertixal resolution, >1
-    - pixelperclock: Pixel per clock in AXI transaction, [2]
+    - pixelperclock: Pixel per clock in AXI transaction, [1, 2, 4, 8]
     - pixelquant: Quantization, 10
     - pattern:
         - p_incr = counter increment on every pixel
         - rand = random
         - h_incr = horizontal pixel increment
+        - seeded = random, reproducible from seed and frameIndex
+        - color_bars, ramp, zone_plate, checkerboard, solid_* = static
+          patterns, see constants.Pattern
+        - moving_box = white box moving with frameIndex
     - format: RGB, YUV444, YUV422, YUV420
+    - signature: return a FrameSignature of the packed lines instead of the
+      reference matrix
+    - frame: return the reference as a planar VideoFrame instead of a matrix
+    - seed, frameIndex: key and frame number of the seeded pattern
+    - compact: compact tuser sideband, see mat2axis
+    - beats: return the frame as one BeatArray instead of AXIS lines
+    - cache: StimulusCache or MemoryCache to load the packed frame and
+      reference from, or store them in; not used for the rand pattern or
+      with frame
+    - standard: BT601, BT709, BT2020, of the patterns defined as RGB images
+      when format is YUV
+
+    With a cache, repeating a pattern only rebuilds the AXIS lines from the
+    packed frame; static patterns are keyed without seed and frameIndex.
     """
     c ,r, q = resH, resV, pixelQuant
-    rgb = np.zeros((r, c, 3), dtype=np.uint64)
-
-    if pattern == Pattern.p_incr:
-        for i in range(r):
-            for j in range(c):
-                for k in range(3):
-                    rgb[i, j, k] = (i * r * 3 + j * 3 + k) % (2**q)
-    elif pattern == Pattern.rand: # TODO: Fix bug here. The matrix returned isn't matching data on simulation (gtkwave)
-        rgb = np.random.rand(r, c, 3)
-        rgb = (rgb*((2**q)-1)).astype(np.uint64)
-    elif pattern == Pattern.h_incr:
-        for i in range(r):
-            for j in range(c):
-                rgb[i, j, :] = j % (2**q)
+    if cache is not None and not frame and pattern != Pattern.rand:
+        varying = pattern not in STATIC_PATTERNS
+        key = cache.key("GenAXIStream", c, r, pixelPerClock, q, int(pattern), int(format), int(standard),
+            seed if varying else 0, frameIndex if varying else 0)
+        entry = cache.fetch(key)
+        if entry is None:
+            entry = GenAXIStream(c, r, pixelPerClock, q, pattern, format, seed=seed, frameIndex=frameIndex,
+                beats=True, standard=standard)
+            cache.store(key, *entry)
+        packed, rgbreshape = entry
+        axis = packed if beats else beats2axis(packed, compact)
+        return axis, frame_signature(axis) if signature else rgbreshape
+
+    rgb = pattern_frame(c, r, q, pattern, seed=seed, frameIndex=frameIndex, format=format, standard=standard)
+
+    if frame:
+        ref = VideoFrame.from_matrix(np.reshape(rgb, (r*c, 3)), c, format, q, standard)
+        if beats:
+            axis = mat2beats(ref, resH, pixelPerClock, q, format)
+        else:
+            axis = mat2axis(ref, resH, pixelPerClock, q, format, compact=compact)
+        return axis, frame_signature(axis) if signature else ref
+
+    rgbreshape = np.reshape(rgb, (r*c,3))
+    rgbreshape[chroma_mask(c, r, format), 1:] = 0
+    if beats:
+        axis = mat2beats(rgbreshape, resH, pixelPerClock, q, format)
     else:
-        raise ValueError("Unknown pattern")
-
-    mask = np.ones((r*c, 3), dtype=np.uint64)
-    vcount, hcount = 0, 0
-    if (format == ColorFormat.YUV422):
-        for i in range(r*c):
-            if (i%2) :
-                mask[i][1:] = [0, 0]
-    elif (format == ColorFormat.YUV420):
-        for i in range(r*c):
-            if (i%2) :
-                mask[i][1:] = [0, 0]
-            if vcount%2 :
-                mask[i][1:] = [0, 0]
-            if hcount == resH-1:
-                vcount = vcount + 1
-                hcount = 0
-            else:
-                hcount = hcount + 1
-
-    rgbreshape = np.reshape(rgb, newshape=(r*c,3))
-    rgbreshape = rgbreshape*mask
-    axis = mat2axis(rgbreshape, resH, pixelPerClock, 10, format)
+        axis = mat2axis(rgbreshape, resH, pixelPerClock, q, format, compact=compact)
 
+    if signature:
+        return axis, frame_signature(axis)
     return axis, rgbreshape
 
 
-def ConvertAXIStreamCS(resH, pixelPerClock, pixelQuant, inputFormat, outputFormat, axisFrame):
+def GenAXIStreamLines(resH, resV, pixelPerClock, pixelQuant, pattern, format, reference=False,
+        seed=0, frameIndex=0, lines=None, compact=False, standard=Standard.BT2020):
     """
-    - returns: Color converted AXIS
+    - returns: generator of AXIS transactions, one line at a time
+    - resh: Horizontal resoltuion, >1
+    - resv: Vertixal resolution, >1
+    - pixelperclock: Pixel per clock in AXI transaction, [1, 2, 4, 8]
+    - pixelquant: Quantization, 10
+    - pattern: any Pattern, see GenAXIStream
+    - format: RGB, YUV444, YUV422, YUV420
+    - reference: also yield the (resH, 3) matrix of each line, as (axis, line)
+    - seed, frameIndex: key and frame number of the seeded pattern
+    - lines: line numbers to build, default all resV lines; with the seeded
+      pattern any line can be rebuilt on its own, e.g. by a checker
+    - compact: compact tuser sideband, see mat2axis
+    - standard: BT601, BT709, BT2020, see GenAXIStream
+
+    Each line is built only when it is requested, so memory stays at one
+    line and the first line can be sent before the rest of the frame exists.
+    The lines are identical to the ones returned by GenAXIStream.
+
+        for line in GenAXIStreamLines(1920, 1080, 2, 10, Pattern.h_incr, ColorFormat.RGB):
+            await source.send(line)
+    """
+    c, r, q = resH, resV, pixelQuant
+    for k in range(r) if lines is None else lines:
+        line = slice(k, k+1)
+        rgb = np.reshape(pattern_frame(c, r, q, pattern, line, seed, frameIndex, format, standard), (c, 3))
+        rgb[chroma_mask(c, r, format, line), 1:] = 0
+        axis = mat2axis(rgb, resH, pixelPerClock, q, format, firstLine=k, compact=compact)[0]
+        yield (axis, rgb) if reference else axis
+
+
+@instrumented("generate", produced)
+def GenAXIStreamBatch(resH, resV, pixelPerClock, pixelQuant, pattern, format, frames, seed=0, frameIndex=0,
+        compact=False, standard=Standard.BT2020):
+    """
+    - returns: list of AXIS transactions, one per frame, and the reference
+      frames as a numpy array of shape (frames, resV, resH, 3)
+    - resh: Horizontal resoltuion, >1
+    - resv: Vertixal resolution, >1
+    - pixelperclock: Pixel per clock in AXI transaction, [1, 2, 4, 8]
+    - pixelquant: Quantization, 10
+    - pattern: any Pattern, see GenAXIStream
+    - format: RGB, YUV444, YUV422, YUV420
+    - frames: number of frames
+    - seed, frameIndex: key and number of the first frame of the seeded pattern
+    - compact: compact tuser sideband, see mat2axis
+    - standard: BT601, BT709, BT2020, see GenAXIStream
+
+    Each frame matches GenAXIStream. The pattern and chroma mask are built
+    once; patterns that do not change between frames are packed once and
+    the reference is then a read-only view repeating that frame.
+    """
+    c, r, q = resH, resV, pixelQuant
+    mask = chroma_mask(c, r, format)
+    if pattern not in STATIC_PATTERNS:
+        rgb = np.stack([pattern_frame(c, r, q, pattern, seed=seed, frameIndex=frameIndex+f, format=format,
+            standard=standard) for f in range(frames)]).reshape(frames, r*c, 3)
+        rgb[:, mask, 1:] = 0
+        rgb = rgb.reshape(frames, r, c, 3)
+        return mat2axis_batch(rgb, c, pixelPerClock, q, format, compact), rgb
+
+    rgb = np.reshape(pattern_frame(c, r, q, pattern, format=format, standard=standard), (r*c, 3))
+    rgb[mask, 1:] = 0
+    axis = mat2axis(rgb, c, pixelPerClock, q, format, compact=compact)
+    batch = [axis] + [[_axis_line(bytearray(line.tdata), copy.copy(line.tuser)) for line in axis] for _ in range(frames-1)]
+    return batch[:frames], np.broadcast_to(rgb.reshape(r, c, 3), (frames, r, c, 3))
+
+
+@instrumented("convert", produced)
+def ConvertAXIStreamCS(resH, pixelPerClock, pixelQuant, inputFormat, outputFormat, axisFrame, signature=False,
+        standard=Standard.BT2020, compact=False, beats=False, cache=None):
+    """
+    - returns: Color converted AXIS, and its reference matrix
     - resH: Horizontal resoltuion, >1
-    - pixelperclock: Pixel per clock in AXI transaction, [2]
+    - pixelperclock: Pixel per clock in AXI transaction, [1, 2, 4, 8]
     - pixelquant: Quantization, 10
     - inputFormat: RGB, YUV444, YUV422, YUV420
     - outputFormat: RGB, YUV444, YUV422, YUV420
-    - axisFrame: input frame to color convert
+    - axisFrame: input frame to color convert, AXIS lines or a BeatArray
+    - signature: return a FrameSignature of the packed lines instead of the
+      reference matrix
+    - standard: BT601, BT709, BT2020
+    - compact: compact tuser sideband, see mat2axis
+    - beats: return the frame as one BeatArray instead of AXIS lines
+    - cache: StimulusCache keyed by the arguments and the input tdata
+
+    YUV is TV range and RGB full range. The reference matrix is in the
+    channel order of mat2axis, with dropped chroma set to 0.
     """
-    mat = axis2mat(axisFrame, resH, pixelPerClock, pixelQuant, inputFormat)
-    if inputFormat == ColorFormat.RGB:
-        if outputFormat == ColorFormat.YUV444:
-            conv = rgb2yuv(mat, Standard.BT2020)
-            return mat2axis(conv.T, resH, pixelPerClock, pixelQuant, ColorFormat.YUV444), conv.T
-        else:
-            raise ValueError("Unsupported Format combination")
-    elif inputFormat == ColorFormat.YUV444:
-        if outputFormat == ColorFormat.YUV422:
-            conv = y444to422(mat)
-            return mat2axis(conv.T, resH, pixelPerClock, pixelQuant, ColorFormat.YUV422), conv.T
+    c, q = resH, pixelQuant
+    if cache is not None:
+        if isinstance(axisFrame, BeatArray):
+            data, r = [axisFrame.tdata], axisFrame.lines
         else:
-            raise ValueError("Unsupported Format combination")
-    elif inputFormat == ColorFormat.YUV420:
-        if outputFormat == ColorFormat.YUV422:
-            conv = y420to422(mat, resH)
-            return mat2axis(conv.T, resH, pixelPerClock, pixelQuant, ColorFormat.YUV420), conv.T
+            data, r = [line.tdata for line in axisFrame], len(axisFrame)
+        key = cache.key("ConvertAXIStreamCS", c, pixelPerClock, q, int(inputFormat), int(outputFormat),
+            int(standard), r, data=data)
+        entry = cache.fetch(key)
+        if entry is None:
+            entry = ConvertAXIStreamCS(c, pixelPerClock, q, inputFormat, outputFormat, axisFrame,
+                standard=standard, beats=True)
+            cache.store(key, *entry)
+        packed, ref = entry
+        axis = packed if beats else beats2axis(packed, compact)
+        return axis, frame_signature(axis) if signature else ref
+
+    r = axisFrame.lines if isinstance(axisFrame, BeatArray) else len(axisFrame)
+    frame = VideoFrame.zeros(c, r, inputFormat, q, standard)
+    axis2mat(axisFrame, c, pixelPerClock, q, inputFormat, out=frame)
+    conv = convert_frame(frame, outputFormat, standard)
+    if beats:
+        axis = mat2beats(conv, c, pixelPerClock, q, outputFormat)
+    else:
+        axis = mat2axis(conv, c, pixelPerClock, q, outputFormat, compact=compact)
+
+    if signature:
+        return axis, frame_signature(axis)
+    return axis, conv.to_matrix()
+
+
+@instrumented("convert", produced)
+def ConvertAXIStreamCSBatch(resH, pixelPerClock, pixelQuant, inputFormat, outputFormat, frames,
+        standard=Standard.BT2020, compact=False):
+    """
+    - returns: list of color converted AXIS transactions, one per frame, and
+      the reference frames as a numpy array of shape (N, r, resH, 3)
+    - frames: list of N input frames, each a list of AXIS lines
+    - other arguments as ConvertAXIStreamCS
+
+    The whole batch is unpacked, converted and packed in one pass; only
+    conversions that resample chroma vertically go frame by frame so that
+    filters do not cross frame boundaries.
+    """
+    c, q = resH, pixelQuant
+    n = len(frames)
+    mat = axis2mat_batch(frames, c, pixelPerClock, q, inputFormat)
+    r = mat.shape[1]
+    if inputFormat == ColorFormat.RGB:
+        # axis2mat returns R, G, B, frames are built in bus order G, B, R
+        mat = mat[..., [1, 2, 0]]
+    yuv420 = (inputFormat == ColorFormat.YUV420, outputFormat == ColorFormat.YUV420)
+    if yuv420[0] != yuv420[1] or (r % 2 and any(yuv420)):
+        ref = np.stack([convert_frame(VideoFrame.from_matrix(m, c, inputFormat, q, standard),
+            outputFormat, standard).to_matrix() for m in mat.reshape(n, r*c, 3)])
     else:
-        raise ValueError("Unsupported inputFormat")
+        frame = VideoFrame.from_matrix(mat.reshape(n*r*c, 3), c, inputFormat, q, standard)
+        ref = convert_frame(frame, outputFormat, standard).to_matrix()
+    ref = ref.reshape(n, r, c, 3)
+    return mat2axis_batch(ref, c, pixelPerClock, q, outputFormat, compact), ref
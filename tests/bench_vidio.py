@@ -0,0 +1,212 @@
+""" Offline benchmark of generation, packing, unpacking and color conversion
+
+Every case runs in a forked process, repeat times for the best wall time
+with the garbage collector paused, as timeit does, and once more under
+tracemalloc for peak memory. Results are compared with bench_baseline.json,
+a case slower or larger than its baseline by more than the tolerance fails
+the run with exit status 1.
+
+	python -m tests.bench_vidio                         # compare with the baseline
+	python -m tests.bench_vidio --update                # record a new baseline
+	python -m tests.bench_vidio --resolutions 720p --filter mat2axis
+
+Baselines are only comparable on the machine that recorded them.
+"""
+
+import argparse
+import fnmatch
+import gc
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from cocotbext.vidio import GenAXIStream, ConvertAXIStreamCS, Instrumentation, __version__
+from cocotbext.vidio import constants as const
+from cocotbext.vidio import csc, utils
+
+RESOLUTIONS = {"720p": (1280, 720), "1080p": (1920, 1080), "4K": (3840, 2160), "8K": (7680, 4320)}
+PIXEL_PER_CLOCK = (2, 4)
+PIXEL_QUANT = 10
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+
+def _frame(resH, resV, fmt):
+	""" reference matrix of a random frame in fmt"""
+	np.random.seed(0)
+	return GenAXIStream(resH, resV, 2, PIXEL_QUANT, const.Pattern.seeded, fmt, beats=True)[1]
+
+def _gen(resH, resV, ppc, pattern, fmt):
+	def setup():
+		np.random.seed(0)
+		return ()
+	return setup, lambda: GenAXIStream(resH, resV, ppc, PIXEL_QUANT, pattern, fmt)
+
+def _mat2axis(resH, resV, ppc, fmt):
+	return lambda: (_frame(resH, resV, fmt),), lambda mat: utils.mat2axis(mat, resH, ppc, PIXEL_QUANT, fmt)
+
+def _axis2mat(resH, resV, ppc, fmt):
+	setup = lambda: (utils.mat2axis(_frame(resH, resV, fmt), resH, ppc, PIXEL_QUANT, fmt),)
+	return setup, lambda axis: utils.axis2mat(axis, resH, ppc, PIXEL_QUANT, fmt)
+
+def _convert(resH, resV, ppc, inFmt, outFmt):
+	setup = lambda: (utils.mat2axis(_frame(resH, resV, inFmt), resH, ppc, PIXEL_QUANT, inFmt),)
+	return setup, lambda axis: ConvertAXIStreamCS(resH, ppc, PIXEL_QUANT, inFmt, outFmt, axis)
+
+def _csc(resH, resV, fmt, function):
+	return lambda: (_frame(resH, resV, fmt),), function
+
+def cases(resolutions):
+	"""
+	- returns: list of (name, pixels, setup, run); setup returns the
+	  arguments of run and is not timed
+	"""
+	out = []
+	for res in resolutions:
+		c, r = RESOLUTIONS[res]
+		for ppc in PIXEL_PER_CLOCK:
+			for pattern in const.Pattern:
+				for fmt in const.ColorFormat:
+					out.append(("GenAXIStream/%s/%s/%s/%dppc" % (pattern.name, fmt.name, res, ppc), c*r,
+						*_gen(c, r, ppc, pattern, fmt)))
+			for fmt in const.ColorFormat:
+				out.append(("mat2axis/%s/%s/%dppc" % (fmt.name, res, ppc), c*r, *_mat2axis(c, r, ppc, fmt)))
+				out.append(("axis2mat/%s/%s/%dppc" % (fmt.name, res, ppc), c*r, *_axis2mat(c, r, ppc, fmt)))
+			for inFmt, outFmt in ((const.ColorFormat.RGB, const.ColorFormat.YUV422),
+					(const.ColorFormat.YUV420, const.ColorFormat.RGB)):
+				out.append(("ConvertAXIStreamCS/%s-%s/%s/%dppc" % (inFmt.name, outFmt.name, res, ppc), c*r,
+					*_convert(c, r, ppc, inFmt, outFmt)))
+		out.append(("rgb2yuv/%s" % res, c*r, *_csc(c, r, const.ColorFormat.RGB,
+			lambda mat: csc.rgb2yuv(mat, const.Standard.BT709))))
+		out.append(("y444to422/%s" % res, c*r, *_csc(c, r, const.ColorFormat.YUV444, csc.y444to422)))
+		out.append(("y420to422/%s" % res, c*r, *_csc(c, r, const.ColorFormat.YUV420,
+			lambda mat, c=c: csc.y420to422(mat, c))))
+	return out
+
+def _measure(setup, run, repeat, stages, conn):
+	""" child process: best wall time of run, then its peak traced memory"""
+	try:
+		seconds = float("inf")
+		for _ in range(repeat):
+			args = setup()
+			gc.collect()
+			gc.disable()
+			start = time.perf_counter()
+			result = run(*args)
+			seconds = min(seconds, time.perf_counter() - start)
+			gc.enable()
+			del args, result
+		args = setup()
+		tracemalloc.start()
+		result = run(*args)
+		peak = tracemalloc.get_traced_memory()[1]
+		tracemalloc.stop()
+		del args, result
+		out = {"seconds": seconds, "peak_bytes": peak}
+		if stages:
+			args = setup()
+			with Instrumentation() as inst:
+				run(*args)
+			out["stages"] = inst.as_dict()
+		conn.send(out)
+	except BaseException as e:
+		conn.send({"error": "%s: %s" % (type(e).__name__, e)})
+
+def measure(setup, run, repeat=3, stages=False):
+	"""
+	- returns: dict of seconds and peak_bytes, and with stages the
+	  Instrumentation totals of one more run, or of error when the case
+	  raised or its process died, e.g. out of memory
+	"""
+	ctx = multiprocessing.get_context("fork")
+	recv, send = ctx.Pipe(duplex=False)
+	proc = ctx.Process(target=_measure, args=(setup, run, repeat, stages, send))
+	proc.start()
+	send.close()
+	try:
+		result = recv.recv()
+	except EOFError:
+		result = {"error": "process exited with status %s" % proc.exitcode}
+	proc.join()
+	return result
+
+def compare(results, baseline, tolerance, slack=0.05):
+	"""
+	- returns: list of (name, reason) of the results worse than baseline
+	  by more than tolerance, a fraction; times also by more than slack
+	  seconds, so that timer noise on short cases does not fail the run
+	"""
+	regressions = []
+	for name, result in results.items():
+		base = baseline.get(name)
+		if base is None or "error" in base:
+			continue
+		if "error" in result:
+			regressions.append((name, result["error"]))
+			continue
+		if result["seconds"] > max(base["seconds"] * (1 + tolerance), base["seconds"] + slack):
+			regressions.append((name, "seconds %.4g > baseline %.4g" % (result["seconds"], base["seconds"])))
+		if result["peak_bytes"] > base["peak_bytes"] * (1 + tolerance):
+			regressions.append((name, "peak_bytes %d > baseline %d" % (result["peak_bytes"], base["peak_bytes"])))
+	return regressions
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--resolutions", nargs="+", choices=list(RESOLUTIONS), default=list(RESOLUTIONS))
+	parser.add_argument("--filter", default="*", help="glob on case names, e.g. 'GenAXIStream/*/RGB/*'")
+	parser.add_argument("--baseline", default=BASELINE)
+	parser.add_argument("--repeat", type=int, default=3, help="timed runs per case, the best is kept")
+	parser.add_argument("--tolerance", type=float, default=0.5, help="allowed slowdown or growth, default 0.5")
+	parser.add_argument("--slack", type=float, default=0.05, help="allowed slowdown in seconds, default 0.05")
+	parser.add_argument("--update", action="store_true", help="write the results to the baseline")
+	parser.add_argument("--stages", action="store_true", help="record the per-stage breakdown of every case")
+	parser.add_argument("--output", help="also write the results as JSON to this file")
+	args = parser.parse_args(argv)
+
+	results = {}
+	for name, pixels, setup, run in cases(args.resolutions):
+		if not fnmatch.fnmatch(name, args.filter):
+			continue
+		result = measure(setup, run, args.repeat, args.stages)
+		if "error" not in result:
+			result["pixels_per_second"] = pixels / result["seconds"]
+			print("%-48s %9.4f s %8.2f Mpix/s %9.1f MiB" % (name, result["seconds"],
+				result["pixels_per_second"] / 1e6, result["peak_bytes"] / 2**20), flush=True)
+		else:
+			print("%-48s %s" % (name, result["error"]), flush=True)
+		results[name] = result
+
+	report = {
+		"meta": {"version": __version__, "python": platform.python_version(), "numpy": np.__version__,
+			"machine": platform.machine(), "cpus": os.cpu_count()},
+		"results": results,
+	}
+	if args.output:
+		with open(args.output, "w") as f:
+			json.dump(report, f, indent=1, sort_keys=True)
+	if args.update:
+		baseline = {"meta": report["meta"], "results": {}}
+		if os.path.exists(args.baseline):
+			with open(args.baseline) as f:
+				baseline["results"] = json.load(f)["results"]
+		baseline["results"].update(results)
+		with open(args.baseline, "w") as f:
+			json.dump(baseline, f, indent=1, sort_keys=True)
+		return 0
+
+	if not os.path.exists(args.baseline):
+		print("no baseline at %s, run with --update" % args.baseline)
+		return 0
+	with open(args.baseline) as f:
+		baseline = json.load(f)["results"]
+	regressions = compare(results, baseline, args.tolerance, args.slack)
+	for name, reason in regressions:
+		print("REGRESSION %s: %s" % (name, reason))
+	return 1 if regressions else 0
+
+if __name__ == "__main__":
+	sys.exit(main())
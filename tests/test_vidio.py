@@ -1,18 +1,860 @@
+import functools
+import json
+import os
+import tempfile
+import threading
+import time
+import types
 import unittest
+import unittest.mock
+import numpy as np
+from cocotbext.axi import AxiStreamFrame
 
-from cocotbext.vidio import GenAXIStream
-from cocotbext.vidio.utils import axis2mat
+from cocotbext.vidio import GenAXIStream, GenAXIStreamLines, VideoSource, VideoSink, drive_beats
+from cocotbext.vidio import Scoreboard, compare_frames
+from cocotbext.vidio import ConvertAXIStreamCS, frame_signature, check_signature
+from cocotbext.vidio import GenAXIStreamBatch, ConvertAXIStreamCSBatch, GenAXIStreamSequence, BeatArray
+from cocotbext.vidio import DirtyLinePacker, Instrumentation, add_hook, remove_hook
+from cocotbext.vidio import StimulusCache, MemoryCache, ST2110Packetizer, ST2110Depacketizer
+from cocotbext.vidio.utils import axis2mat, mat2axis, mat2beats, packing_layout
 from cocotbext.vidio import constants as const
 from cocotbext.vidio import csc
+from cocotbext.vidio import tpg
+from cocotbext.vidio import source
+from cocotbext.vidio import RawVideoReader, RawVideoWriter, VideoFrame, resample_chroma, csc_fixed
+from cocotbext.vidio.colorconv import compute_conversion_matrix
+from cocotbext.vidio.rawvideo import raw_frame_size
+from tests import bench_vidio
 
 class Test_tpg(unittest.TestCase):
 	def test_GenRGBAXIStream(self):
-		axi_frame = GenAXIStream(8, 8, 2, 10, "p_incr")
+		axi_frame, _ = GenAXIStream(8, 8, 2, 10, const.Pattern.p_incr, const.ColorFormat.RGB)
 		tuser = axi_frame[0].tuser
 		self.assertEqual(tuser, [1, 1, 1, 1, 1, 1, 1, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0])
 
+	def test_pattern_frame(self):
+		rgb = tpg.pattern_frame(16, 4, 10, const.Pattern.p_incr)
+		for i in range(4):
+			for j in range(16):
+				for k in range(3):
+					self.assertEqual(rgb[i, j, k], (i * 4 * 3 + j * 3 + k) % 1024)
+		rgb = tpg.pattern_frame(2048, 2, 10, const.Pattern.h_incr)
+		self.assertEqual(rgb[1, 1030, 2], 6)
+
+	def test_seeded(self):
+		frame = tpg.pattern_frame(8, 6, 10, const.Pattern.seeded, seed=7, frameIndex=3)
+		self.assertTrue((frame < 1024).all())
+		self.assertTrue((tpg.pattern_frame(8, 6, 10, const.Pattern.seeded, slice(4, 5), seed=7, frameIndex=3) == frame[4:5]).all())
+		self.assertTrue((tpg.seeded_lines(8, 10, 7, 3, [5, 1]) == frame[[5, 1]]).all())
+		self.assertFalse((tpg.pattern_frame(8, 6, 10, const.Pattern.seeded, seed=7, frameIndex=4) == frame).all())
+		self.assertFalse((tpg.pattern_frame(8, 6, 10, const.Pattern.seeded, seed=8, frameIndex=3) == frame).all())
+		axis, mat = GenAXIStream(8, 6, 2, 10, const.Pattern.seeded, const.ColorFormat.YUV420, seed=7, frameIndex=3)
+		(line, ref), = GenAXIStreamLines(8, 6, 2, 10, const.Pattern.seeded, const.ColorFormat.YUV420, True, 7, 3, [3])
+		self.assertEqual(line.tdata, axis[3].tdata)
+		self.assertTrue((ref == mat.reshape(6, 8, 3)[3]).all())
+
+	def test_pattern_library(self):
+		bars = tpg.pattern_frame(16, 2, 10, const.Pattern.color_bars, format=const.ColorFormat.YUV444, standard=const.Standard.BT709)
+		self.assertEqual(bars[1, 0].tolist(), [721, 512, 512])
+		self.assertEqual(bars[0, 15].tolist(), [64, 512, 512])
+		for standard in const.Standard:
+			yuv = tpg.pattern_frame(16, 1, 10, const.Pattern.color_bars, format=const.ColorFormat.YUV444, standard=standard)
+			rgb = csc.yuv2rgb(yuv.reshape(-1, 3), standard)
+			self.assertLessEqual(np.abs(rgb.astype(int) - np.array(tpg._BARS).T.repeat(2, axis=1)*767).max(), 1)
+		# RGB formats are in bus order G, B, R
+		rgb = tpg.pattern_frame(16, 1, 10, const.Pattern.color_bars)
+		self.assertEqual(rgb[0, 2].tolist(), [767, 0, 767])
+		self.assertEqual(tpg.pattern_frame(4, 1, 10, const.Pattern.solid_red)[0, 0].tolist(), [0, 0, 1023])
+		self.assertEqual(tpg.pattern_frame(4, 1, 10, const.Pattern.ramp)[0, :, 0].tolist(), [0, 341, 682, 1023])
+		checker = tpg.pattern_frame(32, 16, 10, const.Pattern.checkerboard)[:, :, 0]
+		self.assertEqual(checker[0, ::8].tolist(), [0, 1023, 0, 1023])
+		self.assertEqual(checker[8, ::8].tolist(), [1023, 0, 1023, 0])
+		zone = tpg.pattern_frame(64, 64, 10, const.Pattern.zone_plate)
+		self.assertEqual(zone[32, 32, 0], 1023)
+		box = [tpg.pattern_frame(64, 64, 10, const.Pattern.moving_box, frameIndex=f)[:, :, 0] for f in (0, 1)]
+		self.assertEqual(int((box[0] > 0).sum()), 32*32)
+		self.assertTrue(box[1][4, 4] and not box[1][3, 3])
+
+	def test_memory_cache(self):
+		cache = MemoryCache()
+		a, ref = GenAXIStream(16, 4, 2, 10, const.Pattern.color_bars, const.ColorFormat.YUV422, beats=True, cache=cache)
+		b, ref2 = GenAXIStream(16, 4, 2, 10, const.Pattern.color_bars, const.ColorFormat.YUV422, beats=True, cache=cache)
+		self.assertTrue((a.tdata == b.tdata).all())
+		self.assertFalse(b.tdata.flags.writeable)
+		self.assertEqual((cache.hits, cache.misses), (1, 1))
+		self.assertTrue(ref2.flags.writeable)
+		self.assertEqual(ref2.dtype, np.uint64)
+		ref2[0] = 0
+		axis, ref3 = GenAXIStream(16, 4, 2, 10, const.Pattern.color_bars, const.ColorFormat.YUV422, cache=cache)
+		self.assertTrue((axis2mat(axis, 16, 2, 10, const.ColorFormat.YUV422) == ref).all())
+		self.assertTrue((ref3 == ref).all())
+		_, other = GenAXIStream(16, 4, 2, 10, const.Pattern.color_bars, const.ColorFormat.YUV422, standard=const.Standard.BT601,
+			cache=cache)
+		self.assertFalse((other == ref).all())
+		self.assertEqual(cache.size(), 2*(a.tdata.nbytes + a.tuser.nbytes + a.tlast.nbytes + ref.size*2))
+		cache.maxBytes = cache.size() - 1
+		cache.evict()
+		self.assertEqual(cache.size(), (cache.maxBytes + 1) // 2)
+		GenAXIStream(16, 4, 2, 10, const.Pattern.color_bars, const.ColorFormat.YUV422, cache=cache)
+		self.assertEqual((cache.hits, cache.misses), (2, 3))
+		_, base = GenAXIStream(16, 4, 2, 10, const.Pattern.h_incr, const.ColorFormat.RGB)
+		self.assertTrue(base.flags.writeable)
+		self.assertEqual(base.dtype, np.uint64)
+
+	def test_generate_frame_rand(self):
+		frames = [tpg.generate_frame(8, 4, 2, 10, "rand", seed=s, frameIndex=f) for s, f in ((1, 0), (1, 0), (2, 0), (1, 1))]
+		tdata = [[l.tdata for l in frame] for frame in frames]
+		self.assertEqual(tdata[0], tdata[1])
+		self.assertNotEqual(tdata[0], tdata[2])
+		self.assertNotEqual(tdata[0], tdata[3])
+
+	def test_rand_matches_stream(self):
+		for fmt in const.ColorFormat:
+			for q in (8, 10, 12, 16):
+				for p in (1, 2, 4, 8):
+					axis, mat = GenAXIStream(16, 4, p, q, const.Pattern.rand, fmt)
+					self.assertTrue(compare_frames(mat, axis2mat(axis, 16, p, q, fmt), 16, q, format=fmt), (fmt, q, p))
+
+	def test_chroma_mask(self):
+		_, y420 = GenAXIStream(8, 4, 2, 10, const.Pattern.h_incr, const.ColorFormat.YUV420)
+		y420 = y420.reshape(4, 8, 3)
+		self.assertTrue((y420[0, 0::2, 1:] == np.arange(0, 8, 2)[:, None]).all())
+		self.assertTrue((y420[0, 1::2, 1:] == 0).all())
+		self.assertTrue((y420[1, :, 1:] == 0).all())
+		self.assertTrue((y420[:, :, 0] == np.arange(8)).all())
+
+	def test_GenAXIStreamLines(self):
+		for fmt in const.ColorFormat:
+			for pattern in const.Pattern:
+				np.random.seed(0)
+				axis, mat = GenAXIStream(8, 6, 4, 10, pattern, fmt)
+				np.random.seed(0)
+				lines = list(GenAXIStreamLines(8, 6, 4, 10, pattern, fmt, reference=True))
+				self.assertEqual([a.tdata for a in axis], [l.tdata for l, _ in lines])
+				self.assertEqual([a.tuser for a in axis], [l.tuser for l, _ in lines])
+				self.assertTrue((np.concatenate([m for _, m in lines]) == mat).all())
+
 class Test_utils(unittest.TestCase):
-	pass
+	def test_mat2axis_p4(self):
+		mat = np.arange(8*2*3, dtype=np.uint64).reshape(16, 3)
+		axis = mat2axis(mat, 8, 4, 10, const.ColorFormat.RGB)
+		self.assertEqual(len(axis), 2)
+		self.assertEqual(len(axis[0].tdata), 32)
+		self.assertEqual(axis[0].tuser, [1]*16 + [0]*16)
+		beat = int.from_bytes(axis[1].tdata[16:32], byteorder='little')
+		for n in range(12):
+			self.assertEqual(beat >> 10*n & 0x3ff, 36 + n)
+
+	def test_mat2axis_dtype(self):
+		mat = np.arange(8*2*3).reshape(16, 3) % 1024
+		for fmt in const.ColorFormat:
+			ref = mat2axis(mat.astype(np.uint64), 8, 2, 10, fmt)
+			axis = mat2axis(mat.astype(np.uint16), 8, 2, 10, fmt)
+			self.assertEqual([a.tdata for a in axis], [a.tdata for a in ref])
+
+	def test_axis2mat(self):
+		mat = np.arange(8*4*3).reshape(32, 3) % 1024
+		for p in [2, 4]:
+			axis = mat2axis(mat, 8, p, 10, const.ColorFormat.YUV444)
+			self.assertTrue((axis2mat(axis, 8, p, 10, const.ColorFormat.YUV444) == mat).all())
+			rgb = axis2mat(axis, 8, p, 10, const.ColorFormat.RGB)
+			self.assertTrue((rgb == mat[:, [2, 0, 1]]).all())
+			tdata = b''.join(a.tdata for a in axis)
+			self.assertTrue((axis2mat(tdata, 8, p, 10, const.ColorFormat.YUV444) == mat).all())
+			with self.assertRaises(ValueError):
+				axis2mat(tdata[:-1], 8, p, 10, const.ColorFormat.YUV444)
+			with self.assertRaises(ValueError):
+				axis2mat(np.frombuffer(tdata + bytes(8), dtype=np.uint8), 8, p, 10, const.ColorFormat.YUV444)
+			beats = mat2beats(mat, 8, p, 10, const.ColorFormat.YUV444)
+			with self.assertRaises(ValueError):
+				axis2mat(BeatArray(beats.tdata[:-1], beats.tuser, beats.tlast, beats.lines), 8, p, 10, const.ColorFormat.YUV444)
+		_, y420 = GenAXIStream(8, 4, 4, 10, const.Pattern.p_incr, const.ColorFormat.YUV420)
+		axis = mat2axis(y420, 8, 4, 10, const.ColorFormat.YUV420)
+		self.assertTrue((axis2mat(axis, 8, 4, 10, const.ColorFormat.YUV420) == y420).all())
+
+	def test_layouts(self):
+		self.assertIs(packing_layout(const.ColorFormat.RGB, 8, 12), packing_layout(const.ColorFormat.RGB, 8, 12))
+		self.assertEqual(packing_layout(const.ColorFormat.RGB, 8, 12).beat_bytes, 40)
+		self.assertEqual(packing_layout(const.ColorFormat.RGB, 8, 12, padBits=8).beat_bytes, 36)
+		self.assertEqual(packing_layout(const.ColorFormat.YUV422, 1, 10).unit, 2)
+		with self.assertRaises(ValueError):
+			packing_layout(const.ColorFormat.RGB, 3, 10)
+		for fmt in const.ColorFormat:
+			for p in (1, 2, 4, 8):
+				for q in (8, 10, 12, 16):
+					for pad in (64, 8):
+						axis, mat = GenAXIStream(16, 4, p, q, const.Pattern.seeded, fmt, seed=q)
+						if pad != 64:
+							axis = mat2axis(mat, 16, p, q, fmt, padBits=pad)
+						layout = packing_layout(fmt, p, q, pad)
+						self.assertEqual(len(axis[0].tdata), layout.line_bytes(16))
+						self.assertEqual(axis[0].tuser.count(1), layout.beat_bytes)
+						out = axis2mat(axis, 16, p, q, fmt, padBits=pad)
+						if fmt == const.ColorFormat.RGB:
+							out = out[:, [1, 2, 0]]
+						self.assertTrue((out == mat).all(), (fmt, p, q, pad))
+						frame = VideoFrame.from_matrix(mat, 16, fmt, q)
+						self.assertEqual([a.tdata for a in mat2axis(frame, 16, p, q, fmt, padBits=pad)], [a.tdata for a in axis])
+		axis = mat2axis(np.full((8, 3), 0xfff), 8, 8, 12, const.ColorFormat.RGB, padBits=8)
+		self.assertEqual(axis[0].tdata, bytearray([0xff]*36))
+
+	def test_compact(self):
+		mat = np.arange(8*4*3).reshape(32, 3) % 1024
+		for p in (1, 4):
+			full = mat2axis(mat, 8, p, 10, const.ColorFormat.YUV420)
+			compact = mat2axis(mat, 8, p, 10, const.ColorFormat.YUV420, compact=True)
+			self.assertEqual(compact[1].tuser, 0)
+			for a, b in zip(full, compact):
+				self.assertEqual(a.tdata, b.tdata)
+				b.normalize()
+				self.assertEqual(a.tuser, b.tuser)
+		batch, _ = GenAXIStreamBatch(8, 4, 2, 10, const.Pattern.h_incr, const.ColorFormat.RGB, 2, compact=True)
+		self.assertEqual(batch[1][0].tuser, [1]*8 + [0])
+		sink = VideoSink(None, 8, 4, 2, 10, const.ColorFormat.RGB)
+		for line in batch[0] + batch[1]:
+			sink.feed(line)
+		self.assertEqual(sink.frames, 2)
+		self.assertEqual(sink.dropped_lines, 0)
+
+	def test_beats(self):
+		for p in (1, 4):
+			axis, mat = GenAXIStream(8, 4, p, 10, const.Pattern.p_incr, const.ColorFormat.YUV422)
+			beats, ref = GenAXIStream(8, 4, p, 10, const.Pattern.p_incr, const.ColorFormat.YUV422, beats=True)
+			self.assertIsInstance(beats, BeatArray)
+			self.assertTrue((ref == mat).all())
+			self.assertEqual(beats.tdata.tobytes(), b''.join(a.tdata for a in axis))
+			self.assertEqual(beats.beat_bytes, 8*max(p//2, 1))
+			tuser, tlast = beats.sideband()
+			per_line = len(beats) // 4
+			self.assertEqual(np.flatnonzero(tuser).tolist(), [0])
+			self.assertEqual(np.flatnonzero(tlast).tolist(), [per_line*(j+1) - 1 for j in range(4)])
+			self.assertEqual(beats.line(2), bytes(axis[2].tdata))
+			self.assertEqual(frame_signature(beats), frame_signature(axis))
+			self.assertTrue((axis2mat(beats, 8, p, 10, const.ColorFormat.YUV422) == mat).all())
+			out, conv = ConvertAXIStreamCS(8, p, 10, const.ColorFormat.YUV422, const.ColorFormat.RGB, axis)
+			outb, convb = ConvertAXIStreamCS(8, p, 10, const.ColorFormat.YUV422, const.ColorFormat.RGB, beats, beats=True)
+			self.assertEqual(outb.tdata.tobytes(), b''.join(a.tdata for a in out))
+			self.assertTrue((conv == convb).all())
+
+class Test_batch(unittest.TestCase):
+	def test_GenAXIStreamBatch(self):
+		for fmt in const.ColorFormat:
+			for r in (4, 3):
+				np.random.seed(1)
+				batch, ref = GenAXIStreamBatch(8, r, 2, 10, const.Pattern.rand, fmt, 3)
+				np.random.seed(1)
+				for f in range(3):
+					axis, mat = GenAXIStream(8, r, 2, 10, const.Pattern.rand, fmt)
+					self.assertEqual([l.tdata for l in batch[f]], [l.tdata for l in axis])
+					self.assertEqual([l.tuser for l in batch[f]], [l.tuser for l in axis])
+					self.assertTrue((ref[f].reshape(-1, 3) == mat).all())
+		batch, ref = GenAXIStreamBatch(8, 4, 2, 10, const.Pattern.h_incr, const.ColorFormat.YUV420, 2)
+		self.assertIsNot(batch[0][0].tdata, batch[1][0].tdata)
+		self.assertEqual([l.tdata for l in batch[0]], [l.tdata for l in batch[1]])
+
+	def test_ConvertAXIStreamCSBatch(self):
+		for fin, fout in [(const.ColorFormat.RGB, const.ColorFormat.YUV422),
+				(const.ColorFormat.YUV420, const.ColorFormat.RGB), (const.ColorFormat.YUV420, const.ColorFormat.YUV420)]:
+			for r in (4, 3):
+				batch, _ = GenAXIStreamBatch(8, r, 2, 10, const.Pattern.rand, fin, 2)
+				out, ref = ConvertAXIStreamCSBatch(8, 2, 10, fin, fout, batch)
+				for f in range(2):
+					axis, mat = ConvertAXIStreamCS(8, 2, 10, fin, fout, batch[f])
+					self.assertEqual([l.tdata for l in out[f]], [l.tdata for l in axis])
+					self.assertTrue((ref[f].reshape(-1, 3) == mat).all())
+
+	def test_GenAXIStreamSequence(self):
+		axis, mat = GenAXIStream(8, 4, 2, 10, const.Pattern.h_incr, const.ColorFormat.YUV420)
+		frames = list(GenAXIStreamSequence(8, 4, 2, 10, const.Pattern.h_incr, const.ColorFormat.YUV420, 3, workers=2))
+		self.assertEqual(len(frames), 3)
+		for out, ref in frames:
+			self.assertEqual([l.tdata for l in out], [l.tdata for l in axis])
+			self.assertEqual([l.tuser for l in out], [l.tuser for l in axis])
+			self.assertTrue((ref == mat).all())
+		runs = []
+		for workers in (1, 2):
+			np.random.seed(5)
+			runs.append([ref for _, ref in GenAXIStreamSequence(8, 4, 2, 10, const.Pattern.rand, const.ColorFormat.RGB, 5, workers)])
+		self.assertTrue(all((a == b).all() for a, b in zip(*runs)))
+		self.assertFalse((runs[0][0] == runs[0][1]).all())
+		frames = GenAXIStreamSequence(8, 4, 2, 10, const.Pattern.seeded, const.ColorFormat.RGB, 3, workers=2, seed=9)
+		batch, refs = GenAXIStreamBatch(8, 4, 2, 10, const.Pattern.seeded, const.ColorFormat.RGB, 3, seed=9)
+		for i, (out, ref) in enumerate(frames):
+			axis, mat = GenAXIStream(8, 4, 2, 10, const.Pattern.seeded, const.ColorFormat.RGB, seed=9, frameIndex=i)
+			self.assertEqual([l.tdata for l in out], [l.tdata for l in axis])
+			self.assertEqual([l.tdata for l in batch[i]], [l.tdata for l in axis])
+			self.assertTrue((ref == mat).all())
+
+	def test_incremental(self):
+		for fmt in const.ColorFormat:
+			frames = GenAXIStreamSequence(64, 48, 2, 10, const.Pattern.moving_box, fmt, 4, incremental=True, compact=True)
+			prev = None
+			for i, (out, ref) in enumerate(frames):
+				axis, mat = GenAXIStream(64, 48, 2, 10, const.Pattern.moving_box, fmt, frameIndex=i, compact=True)
+				self.assertEqual([l.tdata for l in out], [l.tdata for l in axis])
+				self.assertEqual([l.tuser for l in out], [l.tuser for l in axis])
+				self.assertTrue((ref == mat).all())
+				if prev is not None:
+					self.assertIs(out[-1], prev[-1])
+					self.assertIsNot(out[4*i], prev[4*i])
+				prev = out
+
+		# rand frames are the same in both modes and only their seeds come from np.random
+		outputs = []
+		for incremental in (True, False):
+			np.random.seed(3)
+			outputs.append(list(GenAXIStreamSequence(16, 8, 2, 10, const.Pattern.rand, const.ColorFormat.YUV422, 3,
+				workers=2, incremental=incremental)))
+			state = np.random.get_state()[1]
+			np.random.seed(3)
+			np.random.randint(2**32, size=3)
+			self.assertTrue((state == np.random.get_state()[1]).all())
+		for (inc, inc_ref), (par, par_ref) in zip(*outputs):
+			self.assertEqual([l.tdata for l in inc], [l.tdata for l in par])
+			self.assertTrue((inc_ref == par_ref).all())
+		self.assertFalse((outputs[0][0][1] == outputs[0][1][1]).all())
+
+		packer = DirtyLinePacker(8, 2, 10, const.ColorFormat.YUV420)
+		mat = np.zeros((8*6, 3), dtype=np.uint16)
+		packer.pack(mat)
+		mat[8*3 + 2, 0] = 5
+		mat[8*4, 0] = 7
+		out = packer.pack(mat)
+		self.assertEqual(packer.repacked, 6 + 2)
+		self.assertEqual([l.tdata for l in out], [l.tdata for l in mat2axis(mat, 8, 2, 10, const.ColorFormat.YUV420)])
+
+class Test_bench(unittest.TestCase):
+	def test_compare(self):
+		baseline = {"a": {"seconds": 1.0, "peak_bytes": 100}, "b": {"seconds": 1.0, "peak_bytes": 100}, "c": {"error": "x"}}
+		results = {"a": {"seconds": 1.2, "peak_bytes": 100}, "b": {"seconds": 1.0, "peak_bytes": 200},
+			"c": {"seconds": 9.0, "peak_bytes": 1}, "d": {"seconds": 9.0, "peak_bytes": 1}}
+		self.assertEqual([name for name, _ in bench_vidio.compare(results, baseline, 0.3)], ["b"])
+		self.assertEqual([name for name, _ in bench_vidio.compare(results, baseline, 0.1)], ["a", "b"])
+		self.assertEqual([name for name, _ in bench_vidio.compare(results, baseline, 0.1, slack=0.5)], ["b"])
+		result = bench_vidio.measure(lambda: (1000,), lambda n: np.zeros(n, dtype=np.uint8), repeat=2)
+		self.assertGreaterEqual(result["peak_bytes"], 1000)
+		self.assertIn("error", bench_vidio.measure(lambda: (), lambda: 1 // 0))
+		names = [name for name, *_ in bench_vidio.cases(["720p"])]
+		self.assertIn("GenAXIStream/color_bars/YUV422/720p/4ppc", names)
+		self.assertIn("y420to422/720p", names)
+
+class Test_instrument(unittest.TestCase):
+	def test_stages(self):
+		events = []
+		with Instrumentation(callback=events.append) as inst:
+			axis, _ = GenAXIStream(16, 4, 2, 10, const.Pattern.moving_box, const.ColorFormat.YUV420)
+			ConvertAXIStreamCS(16, 2, 10, const.ColorFormat.YUV420, const.ColorFormat.RGB, axis)
+		stages = inst.as_dict()
+		self.assertEqual(set(stages), {"generate", "pattern", "pack", "unpack", "csc", "resample", "convert"})
+		self.assertEqual(stages["pattern"]["pixels"], 64)
+		self.assertEqual(stages["pack"]["pixels"], 128)
+		self.assertEqual(stages["unpack"]["bytes"], sum(len(l.tdata) for l in axis))
+		self.assertEqual(stages["csc"]["pixels"], 64)
+		self.assertIsNone(stages["pack"]["allocated"])
+		self.assertEqual(len(events), sum(s["calls"] for s in stages.values()))
+		self.assertGreaterEqual(sum(s["seconds"] for s in stages.values()), 0)
+
+		GenAXIStream(16, 4, 2, 10, const.Pattern.seeded, const.ColorFormat.RGB)
+		self.assertEqual(len(events), sum(s["calls"] for s in stages.values()))
+
+		with Instrumentation(memory=True) as inst:
+			csc.rgb2yuv(np.zeros((1 << 16, 3)), const.Standard.BT709)
+		self.assertGreater(inst.stages["csc"].allocated, 1 << 16)
+		with tempfile.TemporaryDirectory() as tmp:
+			inst.dump(os.path.join(tmp, "stages.json"))
+			with open(os.path.join(tmp, "stages.json")) as f:
+				self.assertEqual(json.load(f)["csc"]["calls"], 1)
+
+		seen = []
+		add_hook(seen.append)
+		try:
+			tpg.pattern_frame(8, 2, 10, const.Pattern.ramp)
+		finally:
+			remove_hook(seen.append)
+		self.assertEqual([(e.stage, e.function, e.pixels) for e in seen], [("pattern", "pattern_frame", 16)])
+
+		cache = MemoryCache()
+		GenAXIStream(16, 4, 2, 10, const.Pattern.ramp, const.ColorFormat.YUV422, cache=cache)
+		with tempfile.TemporaryDirectory() as path:
+			disk = StimulusCache(path)
+			GenAXIStream(16, 4, 2, 10, const.Pattern.ramp, const.ColorFormat.YUV422, cache=disk)
+			for c in (cache, disk):
+				events = []
+				with Instrumentation(callback=events.append):
+					axis, _ = GenAXIStream(16, 4, 2, 10, const.Pattern.ramp, const.ColorFormat.YUV422, cache=c)
+				self.assertEqual([(e.function, e.pixels, e.bytes) for e in events if e.stage == "pack"],
+					[("beats2axis", 64, sum(len(l.tdata) for l in axis))])
+
+class Test_source(unittest.TestCase):
+	def test_worker(self):
+		generate = functools.partial(GenAXIStream, 8, 4, 2, 10, const.Pattern.p_incr, const.ColorFormat.RGB)
+		video = VideoSource(None, generate, frames=3, depth=2)
+		video.start()
+		frames = [video.queue.get(timeout=5) for _ in range(3)]
+		video._thread.join(timeout=5)
+		self.assertEqual(video.generated, 3)
+		self.assertIsNone(video.get_nowait())
+		axis, mat = generate()
+		for a, m in frames:
+			self.assertEqual([l.tdata for l in a], [l.tdata for l in axis])
+			self.assertTrue((m == mat).all())
+		video.stop()
+
+	def test_send_frame(self):
+		class Wait:
+			def __init__(self, what):
+				self.what = what
+			def __await__(self):
+				yield self.what
+		class Event:
+			def clear(self):
+				pass
+			def wait(self):
+				return Wait("dequeue")
+		class Source:
+			clock = None
+			def __init__(self):
+				self.queue, self.sent, self.dequeue_event = [], [], Event()
+			def count(self):
+				return len(self.queue)
+			async def send(self, line):
+				self.queue.append(line)
+				self.sent.append(line)
+		def run(coro, release):
+			waits = []
+			try:
+				while True:
+					waits.append(coro.send(None))
+					if waits[-1] == "dequeue":
+						src.queue.clear()
+					else:
+						release()
+						time.sleep(0.001)
+			except StopIteration as e:
+				return e.value, waits
+		gate = threading.Semaphore(0)
+		made = []
+		def generate():
+			gate.acquire()
+			made.append(len(made))
+			return ["%d-%d" % (made[-1], j) for j in range(2)], made[-1]
+		src = Source()
+		video = VideoSource(src, generate, frames=3, depth=1)
+		released = []
+		def ready():
+			for _ in range(500):
+				if video.queue.qsize():
+					break
+				time.sleep(0.01)
+		def release_once():
+			if not released:
+				released.append(gate.release())
+		with unittest.mock.patch.object(source, "RisingEdge", lambda clock: Wait("edge")):
+			try:
+				# nothing generated yet: an underrun, then the frame once it is ready
+				matrix, waits = run(video.send_frame(), release_once)
+				self.assertEqual((matrix, video.underruns), (0, 1))
+				self.assertIn("edge", waits)
+				gate.release()
+				gate.release()
+				ready()
+				# frame 1 is ready but frame 0 still fills the source queue
+				matrix, waits = run(video.send_frame(), lambda: None)
+				self.assertEqual((matrix, video.underruns, waits), (1, 1, ["dequeue"]))
+				ready()
+				matrix, waits = run(video.send_frame(), lambda: None)
+				self.assertEqual((matrix, video.underruns), (2, 1))
+				self.assertEqual(src.sent, ["%d-%d" % (i, j) for i in range(3) for j in range(2)])
+				self.assertTrue(video.done())
+				with self.assertRaises(ValueError):
+					run(video.send_frame(), lambda: None)
+			finally:
+				video.stop()
+
+	def test_drive_beats(self):
+		class Edge:
+			def __init__(self, clock):
+				pass
+			def __await__(self):
+				yield self
+		signal = lambda: types.SimpleNamespace(value=0)
+		bus = types.SimpleNamespace(tdata=signal(), tvalid=signal(), tready=signal(), tuser=signal(),
+			tlast=signal(), tkeep=signal())
+		beats, _ = GenAXIStream(8, 3, 2, 10, const.Pattern.p_incr, const.ColorFormat.YUV422, beats=True)
+		driven = []
+		with unittest.mock.patch.object(source, "RisingEdge", Edge):
+			coro = drive_beats(bus, None, beats)
+			cycle = 0
+			with self.assertRaises(StopIteration):
+				while True:
+					coro.send(None)
+					# tready low on every third cycle
+					bus.tready.value = int(cycle % 3 != 2)
+					cycle += 1
+					if bus.tvalid.value and bus.tready.value:
+						driven.append((bus.tdata.value, bus.tuser.value, bus.tlast.value))
+		self.assertEqual(bus.tvalid.value, 0)
+		self.assertEqual(bus.tkeep.value, (1 << beats.beat_bytes) - 1)
+		self.assertEqual(len(driven), beats.num_beats)
+		self.assertGreater(cycle, beats.num_beats)
+		self.assertEqual([d for d, _, _ in driven], [int.from_bytes(bytes(b), 'little') for b in beats.tdata])
+		per_line = beats.num_beats // 3
+		self.assertEqual([i for i, (_, u, _) in enumerate(driven) if u], [0])
+		self.assertEqual([i for i, (_, _, l) in enumerate(driven) if l], [per_line - 1, 2*per_line - 1, 3*per_line - 1])
+
+class Test_sink(unittest.TestCase):
+	def test_feed(self):
+		for fmt in const.ColorFormat:
+			axis, mat = GenAXIStream(8, 4, 4, 10, const.Pattern.p_incr, fmt)
+			video = VideoSink(None, 8, 4, 4, 10, fmt)
+			frames = [video.feed(line) for line in axis[2:] + axis + axis[:3] + axis]
+			self.assertEqual(video.frames, 2)
+			self.assertEqual(video.dropped_lines, 5)
+			self.assertIsNone(frames[4])
+			ref = axis2mat(axis, 8, 4, 10, fmt)
+			self.assertTrue((frames[5] == ref).all())
+			self.assertTrue((frames[-1] == ref).all())
+			self.assertEqual(sum(f is not None for f in frames), 2)
+
+	def test_malformed(self):
+		axis, mat = GenAXIStream(8, 4, 2, 10, const.Pattern.p_incr, const.ColorFormat.YUV422)
+		long, short = AxiStreamFrame(axis[1].tdata + bytearray(4), tuser=axis[1].tuser), \
+			AxiStreamFrame(axis[2].tdata[:-1], tuser=axis[2].tuser)
+		video = VideoSink(None, 8, 4, 2, 10, const.ColorFormat.YUV422)
+		frames = [video.feed(line) for line in axis[:1] + [long] + axis[2:] + axis[:2] + [short] + axis[3:] + axis]
+		self.assertEqual(video.malformed_lines, 2)
+		self.assertEqual(video.dropped_lines, 2 + 2 + 3 + 1)
+		self.assertEqual(video.frames, 1)
+		self.assertTrue((frames[-1] == mat).all())
+
+class Test_scoreboard(unittest.TestCase):
+	def test_compare_frames(self):
+		_, mat = GenAXIStream(8, 4, 2, 10, const.Pattern.p_incr, const.ColorFormat.RGB)
+		actual = mat.astype(np.int16)
+		self.assertTrue(compare_frames(mat, actual, 8))
+		actual[9, 2] += 1
+		actual[20, 1] -= 5
+		result = compare_frames(mat, actual, 8)
+		self.assertEqual(result.mismatches, 2)
+		self.assertEqual(result.first, (1, 1, 2))
+		self.assertEqual(result.worst, (2, 4, 1))
+		self.assertEqual(result.max_diff, 5)
+		self.assertEqual(result.psnr[0], float("inf"))
+		result = compare_frames(mat, actual, 8, tolerance=(0, 5, 1))
+		self.assertTrue(result)
+
+	def test_scoreboard(self):
+		_, mat = GenAXIStream(8, 4, 2, 10, const.Pattern.h_incr, const.ColorFormat.YUV422)
+		scoreboard = Scoreboard(8)
+		scoreboard.compare(mat, mat)
+		with self.assertLogs("cocotb.vidio.scoreboard", level="ERROR"):
+			scoreboard.compare(mat, mat + 1)
+		self.assertEqual((scoreboard.frames, scoreboard.failures), (2, 1))
+		self.assertEqual(scoreboard.first_failure[0], 1)
+		self.assertFalse(scoreboard.passed())
+
+	def test_axis_roundtrip(self):
+		for fmt in const.ColorFormat:
+			_, mat = GenAXIStream(16, 4, 2, 10, const.Pattern.color_bars, fmt)
+			actual = axis2mat(mat2axis(mat, 16, 2, 10, fmt), 16, 2, 10, fmt)
+			scoreboard = Scoreboard(16, format=fmt)
+			self.assertTrue(scoreboard.compare(mat, actual))
+			actual[18, 0] += 3
+			result = compare_frames(mat, actual, 16, format=fmt)
+			self.assertEqual((result.mismatches, result.first), (1, (1, 2, "R" if fmt == const.ColorFormat.RGB else "Y")))
+		_, mat = GenAXIStream(16, 4, 2, 10, const.Pattern.color_bars, const.ColorFormat.RGB)
+		actual = axis2mat(mat2axis(mat, 16, 2, 10, const.ColorFormat.RGB), 16, 2, 10, const.ColorFormat.RGB)
+		self.assertFalse(compare_frames(mat, actual, 16))
+		self.assertTrue(compare_frames(mat[:, [2, 0, 1]], actual, 16, format=const.ColorFormat.RGB, order="rgb"))
+		with self.assertRaises(ValueError):
+			Scoreboard(16, format=const.ColorFormat.RGB, order="gbr")
+
+class Test_signature(unittest.TestCase):
+	def test_check_signature(self):
+		axis, sig = GenAXIStream(8, 4, 2, 10, const.Pattern.p_incr, const.ColorFormat.YUV420, signature=True)
+		_, mat = GenAXIStream(8, 4, 2, 10, const.Pattern.p_incr, const.ColorFormat.YUV420)
+		self.assertEqual(len(sig), 4)
+		self.assertEqual(sig, frame_signature(axis))
+		self.assertEqual(check_signature(axis, sig, 8, 2, 10, const.ColorFormat.YUV420), {})
+		axis[3].tdata[8] ^= 0x10
+		bad = check_signature(axis, sig, 8, 2, 10, const.ColorFormat.YUV420)
+		self.assertEqual(list(bad), [3])
+		line = mat.reshape(4, 8, 3)[3]
+		self.assertEqual(np.count_nonzero(bad[3] != line), 1)
+		self.assertEqual(list(check_signature(axis[:2], sig, 8, 2, 10, const.ColorFormat.YUV420)), [2, 3])
+
+	def test_convert_signature(self):
+		axis, _ = GenAXIStream(8, 4, 2, 10, const.Pattern.p_incr, const.ColorFormat.RGB)
+		out, mat = ConvertAXIStreamCS(8, 2, 10, const.ColorFormat.RGB, const.ColorFormat.YUV444, axis)
+		_, sig = ConvertAXIStreamCS(8, 2, 10, const.ColorFormat.RGB, const.ColorFormat.YUV444, axis, signature=True)
+		self.assertEqual(sig, frame_signature(out))
+
+class Test_rawvideo(unittest.TestCase):
+	def test_roundtrip(self):
+		cases = [
+			(const.RawFormat.I420, const.ColorFormat.YUV420, 8),
+			(const.RawFormat.NV12, const.ColorFormat.YUV420, 8),
+			(const.RawFormat.P010, const.ColorFormat.YUV420, 10),
+			(const.RawFormat.V210, const.ColorFormat.YUV422, 10),
+		]
+		with tempfile.TemporaryDirectory() as tmp:
+			for raw, fmt, depth in cases:
+				path = os.path.join(tmp, "clip.raw")
+				np.random.seed(0)
+				mats = [GenAXIStream(12, 4, 2, depth, const.Pattern.rand, fmt)[1] for _ in range(3)]
+				with RawVideoWriter(path, raw, 12, 4) as writer:
+					for mat in mats:
+						writer.write(mat)
+				self.assertEqual(os.path.getsize(path), 3*raw_frame_size(raw, 12, 4))
+				with RawVideoReader(path, raw, 12, 4) as reader:
+					self.assertEqual(len(reader), 3)
+					for mat, read in zip(mats, reader):
+						self.assertTrue((read == mat).all())
+					axis = reader.read_axis(1, 2)
+					self.assertEqual([a.tdata for a in axis], [a.tdata for a in mat2axis(mats[1], 12, 2, depth, fmt)])
+
+	def test_rgb(self):
+		with tempfile.TemporaryDirectory() as tmp:
+			path = os.path.join(tmp, "clip.gbrp10")
+			axis, _ = GenAXIStream(8, 2, 2, 10, const.Pattern.p_incr, const.ColorFormat.RGB)
+			with RawVideoWriter(path, const.RawFormat.GBRP10, 8, 2) as writer:
+				writer.write_axis(axis, 2)
+			with open(path, "rb") as f:
+				g = np.frombuffer(f.read(32), dtype='<u2')
+			self.assertEqual(list(g[:3]), [0, 3, 6])
+			with RawVideoReader(path, const.RawFormat.GBRP10, 8, 2) as reader:
+				self.assertEqual([a.tdata for a in reader.read_axis(0, 2)], [a.tdata for a in axis])
+				rgb = reader.read(0)
+			self.assertTrue((rgb == axis2mat(axis, 8, 2, 10, const.ColorFormat.RGB)).all())
+			with self.assertRaises(ValueError):
+				RawVideoWriter(path, const.RawFormat.GBRP10, 8, 2, order="gbr")
+
+	def test_rgb_reader_writer(self):
+		with tempfile.TemporaryDirectory() as tmp:
+			src, dst = os.path.join(tmp, "src.gbrp10"), os.path.join(tmp, "dst.gbrp10")
+			_, mat = GenAXIStream(8, 2, 2, 10, const.Pattern.seeded, const.ColorFormat.RGB)
+			for order in ("rgb", "bus"):
+				with RawVideoWriter(src, const.RawFormat.GBRP10, 8, 2, order="bus") as writer:
+					writer.write(mat)
+				with RawVideoReader(src, const.RawFormat.GBRP10, 8, 2, order=order) as reader, \
+						RawVideoWriter(dst, const.RawFormat.GBRP10, 8, 2, order=order) as writer:
+					frame = reader.read(0)
+					writer.write(frame)
+				with open(src, "rb") as a, open(dst, "rb") as b:
+					self.assertEqual(a.read(), b.read())
+				self.assertTrue((frame == (mat if order == "bus" else mat[:, [2, 0, 1]])).all())
+
+class Test_cache(unittest.TestCase):
+	def test_GenAXIStream(self):
+		with tempfile.TemporaryDirectory() as path:
+			cache = StimulusCache(path)
+			axis, mat = GenAXIStream(8, 4, 2, 10, const.Pattern.seeded, const.ColorFormat.YUV420, seed=3)
+			for _ in range(2):
+				out, ref = GenAXIStream(8, 4, 2, 10, const.Pattern.seeded, const.ColorFormat.YUV420, seed=3, cache=cache)
+				self.assertEqual([l.tdata for l in out], [l.tdata for l in axis])
+				self.assertEqual([l.tuser for l in out], [l.tuser for l in axis])
+				self.assertTrue((ref == mat).all())
+			self.assertEqual((cache.hits, cache.misses), (1, 1))
+			GenAXIStream(8, 4, 2, 10, const.Pattern.seeded, const.ColorFormat.YUV420, seed=4, cache=cache)
+			GenAXIStream(8, 4, 2, 10, const.Pattern.rand, const.ColorFormat.YUV420, cache=cache)
+			self.assertEqual(cache.misses, 2)
+
+			out, conv = ConvertAXIStreamCS(8, 2, 10, const.ColorFormat.YUV420, const.ColorFormat.RGB, axis)
+			for _ in range(2):
+				beats, ref = ConvertAXIStreamCS(8, 2, 10, const.ColorFormat.YUV420, const.ColorFormat.RGB, axis,
+					beats=True, cache=cache)
+				self.assertEqual(beats.tdata.tobytes(), b''.join(l.tdata for l in out))
+				self.assertTrue((ref == conv).all())
+			self.assertEqual((cache.hits, cache.misses), (2, 3))
+
+	def test_evict(self):
+		with tempfile.TemporaryDirectory() as path:
+			cache = StimulusCache(path)
+			keys = [cache.key("frame", i) for i in range(3)]
+			for i, key in enumerate(keys):
+				beats, ref = GenAXIStream(8, 4, 2, 10, const.Pattern.seeded, const.ColorFormat.RGB, seed=i, beats=True)
+				cache.store(key, beats, ref)
+				os.utime(os.path.join(path, key), (i, i))
+			self.assertIsNotNone(cache.fetch(keys[0]))
+			cache.maxBytes = cache.size() * 2 // 3
+			cache.evict()
+			self.assertIsNotNone(cache.fetch(keys[0]))
+			self.assertIsNone(cache.fetch(keys[1]))
+			self.assertIsNotNone(cache.fetch(keys[2]))
+
+class Test_frame(unittest.TestCase):
+	def test_GenAXIStream_frame(self):
+		for fmt in const.ColorFormat:
+			for p in [2, 4]:
+				axis, mat = GenAXIStream(8, 6, p, 10, const.Pattern.p_incr, fmt)
+				faxis, frame = GenAXIStream(8, 6, p, 10, const.Pattern.p_incr, fmt, frame=True)
+				self.assertEqual([a.tdata for a in faxis], [a.tdata for a in axis])
+				self.assertTrue((frame.to_matrix() == mat).all())
+				self.assertEqual(VideoFrame.from_matrix(mat, 8, fmt), frame)
+				decoded = axis2mat(axis, 8, p, 10, fmt, out=VideoFrame.zeros(8, 6, fmt))
+				self.assertEqual(decoded, frame)
+		self.assertEqual(frame.planes[1].shape, (3, 4))
+		self.assertEqual(frame.nbytes, 8*6*2 + 2*3*4*2)
+		self.assertEqual(frame.standard, const.Standard.BT2020)
+		self.assertEqual(VideoFrame.zeros(8, 6, fmt).standard, const.Standard.BT2020)
+		_, frame = GenAXIStream(8, 6, 2, 10, const.Pattern.color_bars, fmt, frame=True, standard=const.Standard.BT601)
+		self.assertEqual(frame.standard, const.Standard.BT601)
+
+	def test_csc_frame(self):
+		_, mat = GenAXIStream(8, 6, 2, 10, const.Pattern.p_incr, const.ColorFormat.RGB)
+		frame = VideoFrame.from_matrix(mat, 8, const.ColorFormat.RGB, standard=const.Standard.BT2020)
+		rgb = axis2mat(mat2axis(mat, 8, 2, 10, const.ColorFormat.RGB), 8, 2, 10, const.ColorFormat.RGB)
+		y444 = csc.rgb2yuv(frame)
+		self.assertEqual(y444.format, const.ColorFormat.YUV444)
+		self.assertTrue((y444.to_matrix() == csc.rgb2yuv(rgb, const.Standard.BT2020).T).all())
+		y422 = csc.y444to422(y444)
+		ref = csc.y444to422(y444.to_matrix().astype(np.int16)).T.reshape(6, 8, 3)
+		self.assertTrue((y422.to_matrix().reshape(6, 8, 3)[:, 0::2] == ref[:, 0::2]).all())
+		_, mat = GenAXIStream(8, 6, 2, 10, const.Pattern.p_incr, const.ColorFormat.YUV420)
+		y420 = VideoFrame.from_matrix(mat, 8, const.ColorFormat.YUV420)
+		ref = csc.y420to422(mat.astype(np.int16), 8).T
+		self.assertTrue((csc.y420to422(y420).to_matrix() == ref).all())
+
+class Test_resample(unittest.TestCase):
+	def test_decimate(self):
+		frame = VideoFrame.zeros(6, 2, const.ColorFormat.YUV444)
+		frame.planes[1][:] = [10, 20, 30, 40, 50, 60]
+		frame.planes[2][:] = 500
+		keep = frame.planes[1].copy()
+		y422 = resample_chroma(frame, const.ColorFormat.YUV422)
+		self.assertTrue((frame.planes[1] == keep).all())
+		self.assertEqual(y422.planes[1][0].tolist(), [13, 30, 50])
+		self.assertTrue((y422.planes[2] == 500).all())
+		y422 = resample_chroma(frame, const.ColorFormat.YUV422, hTaps=(1,), rounding=False)
+		self.assertEqual(y422.planes[1][0].tolist(), [10, 30, 50])
+		y420 = resample_chroma(frame, const.ColorFormat.YUV420)
+		self.assertEqual(y420.planes[1].shape, (1, 3))
+
+	def test_interpolate(self):
+		frame = VideoFrame.zeros(6, 4, const.ColorFormat.YUV420)
+		frame.planes[1][:] = [[10, 20, 31], [30, 40, 50]]
+		y444 = resample_chroma(frame, const.ColorFormat.YUV444)
+		self.assertEqual(y444.planes[1][0].tolist(), [10, 15, 20, 26, 31, 31])
+		self.assertEqual(y444.planes[1][1].tolist(), [20, 25, 30, 36, 41, 41])
+		self.assertEqual(y444.planes[1][3].tolist(), y444.planes[1][2].tolist())
+		y422 = resample_chroma(frame, const.ColorFormat.YUV422, vTaps=(-1, 9, 9, -1))
+		self.assertEqual(y422.planes[1][:, 0].tolist(), [10, 20, 30, 31])
+		down = resample_chroma(y444, const.ColorFormat.YUV420, hTaps=(1,), vTaps=(1,))
+		self.assertEqual(down, frame)
+
+class Test_csc(unittest.TestCase):
+	def test_coefficients(self):
+		matrix, offset = csc.csc_coefficients(const.Standard.BT709, 8, toRGB=True, fracBits=16)
+		ref = compute_conversion_matrix("709", "8bit")
+		self.assertTrue(np.allclose(matrix / 2**16, ref[:, :3], atol=1e-4))
+		self.assertTrue(np.allclose(offset / 2**16, ref[:, 3]*255, atol=1e-4))
+		self.assertIs(csc.csc_coefficients(const.Standard.BT709, 8, toRGB=True, fracBits=16)[0], matrix)
+		self.assertFalse(matrix.flags.writeable)
+
+	def test_csc_fixed(self):
+		rgb = np.array([[1023, 1023, 1023], [0, 0, 0], [1023, 0, 0]], dtype=np.int32)
+		yuv = csc_fixed(rgb, const.Standard.BT709)
+		self.assertIs(yuv, rgb)
+		self.assertEqual(yuv.tolist(), [[940, 512, 512], [64, 512, 512], [250, 409, 960]])
+		rgb = csc_fixed(yuv.copy(), const.Standard.BT709, toRGB=True)
+		self.assertEqual(rgb.tolist(), [[1023, 1023, 1023], [0, 0, 0], [1023, 0, 0]])
+		full = csc_fixed([[1023, 1023, 1023]], const.Standard.BT601, fullRange=True, rounding="truncate")
+		self.assertEqual(full.tolist(), [[1023, 512, 512]])
+		with self.assertRaises(ValueError):
+			csc_fixed(rgb, const.Standard.BT709, rounding="even")
+
+		frame = VideoFrame.zeros(4, 2, const.ColorFormat.RGB, standard=const.Standard.BT709)
+		frame.planes[2][:] = 1023
+		y444 = csc_fixed(frame)
+		self.assertEqual(y444.format, const.ColorFormat.YUV444)
+		self.assertTrue((y444.planes[0] == 250).all())
+		self.assertEqual(csc_fixed(y444), frame)
+
+	def test_yuv2rgb(self):
+		yuv = np.array([[940, 512, 512], [64, 512, 512], [502, 400, 700]])
+		ref = compute_conversion_matrix("709", "10bit")
+		rgb = np.clip(np.rint((yuv / 1023) @ ref[:, :3].T * 1023 + ref[:, 3] * 1023), 0, 1023)
+		self.assertEqual(csc.yuv2rgb(yuv, const.Standard.BT709).T.tolist(), rgb.tolist())
+		self.assertEqual(csc.yuv2rgb(yuv, const.Standard.BT709)[:, 0].tolist(), [1023, 1023, 1023])
+
+	def test_compute_conversion_matrix(self):
+		# colorconv has exact levels at 8 bits and at 10 bits for BT.709/BT.2020
+		names = {const.Standard.BT601: "601", const.Standard.BT709: "709", const.Standard.BT2020: "2020"}
+		for standard, name in names.items():
+			for q in (8, 10):
+				A = compute_conversion_matrix(name, "%dbit" % q)
+				matrix, shift = csc._tv_affine(standard, q, True)
+				exact = np.allclose(A[:, :-1], matrix) and np.allclose(A[:, -1] * ((1 << q) - 1), shift)
+				# at 10 bits colorconv gives BT.601 its 8-bit levels over 255, not 64..940
+				self.assertEqual(exact, not (standard == const.Standard.BT601 and q == 10), (standard, q))
+
+	def test_tv_levels(self):
+		for standard in const.Standard:
+			for q in (8, 10, 12):
+				maxval = (1 << q) - 1
+				rgb = np.array([[maxval]*3, [0]*3, [maxval, 0, 0], [0, maxval, 0], [0, 0, maxval], [maxval//3, maxval//2, maxval//5]])
+				fixed = csc_fixed(rgb, standard, pixelQuant=q)
+				frame = VideoFrame.zeros(6, 1, const.ColorFormat.RGB, q, standard)
+				frame.planes[0][0], frame.planes[1][0], frame.planes[2][0] = rgb[:, 1], rgb[:, 2], rgb[:, 0]
+				yuv = csc.convert_frame(frame, const.ColorFormat.YUV444, standard)
+				self.assertLessEqual(np.abs(yuv.to_matrix().astype(int) - fixed).max(), 1, (standard, q))
+				self.assertEqual(yuv.to_matrix()[:2, 0].tolist(), [235 << (q-8), 16 << (q-8)])
+				back = csc.yuv2rgb(fixed, standard, q).T
+				self.assertLessEqual(np.abs(back.astype(int) - csc_fixed(fixed, standard, q, toRGB=True)).max(), 1)
+		self.assertEqual(csc.yuv2rgb([[940, 512, 512], [64, 512, 512]], const.Standard.BT601)[0].tolist(), [1023, 0])
+		self.assertEqual(csc.yuv2rgb([[3760, 2048, 2048], [256, 2048, 2048]], const.Standard.BT709, 12)[0].tolist(), [4095, 0])
+
+	def test_convert_all(self):
+		fmts = list(const.ColorFormat)
+		axis, rgb = GenAXIStream(8, 4, 2, 10, const.Pattern.rand, const.ColorFormat.RGB)
+		for standard in const.Standard:
+			yuv, _ = ConvertAXIStreamCS(8, 2, 10, const.ColorFormat.RGB, const.ColorFormat.YUV444, axis, standard=standard)
+			back, mat = ConvertAXIStreamCS(8, 2, 10, const.ColorFormat.YUV444, const.ColorFormat.RGB, yuv, standard=standard)
+			self.assertLessEqual(np.abs(mat.astype(int) - rgb).max(), 2)
+			for fin in fmts:
+				src, _ = ConvertAXIStreamCS(8, 2, 10, const.ColorFormat.RGB, fin, axis, standard=standard)
+				for fout in fmts:
+					out, mat = ConvertAXIStreamCS(8, 2, 10, fin, fout, src, standard=standard)
+					self.assertEqual(len(out), 4)
+					self.assertTrue((axis2mat(out, 8, 2, 10, fout) >= 0).all())
+
+class Test_st2110(unittest.TestCase):
+	def test_roundtrip(self):
+		for fmt in (const.ColorFormat.YUV422, const.ColorFormat.YUV444, const.ColorFormat.RGB):
+			axis, _ = GenAXIStream(16, 4, 2, 10, const.Pattern.rand, fmt)
+			mat = axis2mat(axis, 16, 2, 10, fmt).astype(int)
+			for depth in (8, 10, 12):
+				st2110 = ST2110Packetizer(16, 4, fmt, depth, maxPacket=40)
+				frames = ST2110Depacketizer(16, 4, fmt, depth).depacketize(st2110.packets_axis(axis, 2, 10))
+				ref = mat >> 2 if depth == 8 else mat << (depth - 10)
+				self.assertEqual(len(frames), 1)
+				self.assertTrue((frames[0] == ref).all())
+
+	def test_headers(self):
+		mat = np.zeros((8*2, 3), dtype=int)
+		st2110 = ST2110Packetizer(8, 2, const.ColorFormat.YUV422, 10, maxPacket=30, seq=0xfffe, timestamp=100)
+		packets = list(st2110.packets(mat))
+		self.assertEqual(len(packets), 4)
+		self.assertTrue(all(p[0] == 0x80 for p in packets))
+		self.assertEqual([p[1] >> 7 for p in packets], [0, 0, 0, 1])
+		seq = [int.from_bytes(p[12:14] + p[2:4], "big") for p in packets]
+		self.assertEqual(seq, [0xfffe, 0xffff, 0x10000, 0x10001])
+		self.assertEqual([int.from_bytes(p[4:8], "big") for p in packets], [100]*4)
+		self.assertEqual([(int.from_bytes(p[16:18], "big"), int.from_bytes(p[18:20], "big")) for p in packets],
+			[(0, 0), (0, 4), (1, 0), (1, 4)])
+		self.assertEqual([int.from_bytes(p[14:16], "big") for p in packets], [10]*4)
+		second = list(st2110.packets(mat))
+		self.assertEqual(int.from_bytes(second[0][2:4], "big"), 2)
+		self.assertEqual(int.from_bytes(second[0][4:8], "big"), 1600)
+
+	def test_lost(self):
+		mat = np.zeros((8*2, 3), dtype=int)
+		packets = list(ST2110Packetizer(8, 2, const.ColorFormat.YUV422, 10, maxPacket=30).packets(mat))
+		depacketizer = ST2110Depacketizer(8, 2, const.ColorFormat.YUV422, 10)
+		self.assertEqual(len(depacketizer.depacketize(packets[:1] + packets[2:])), 1)
+		self.assertEqual(depacketizer.lost, 1)
+		with self.assertRaises(ValueError):
+			ST2110Packetizer(8, 2, const.ColorFormat.YUV420, 10)
 
 
 # unittest.main()